@@ -0,0 +1,92 @@
+"""
+Scaling of the word-to-field proximity matching used by dataset.py.
+
+Runs the legacy page x field x word loop and the grid-index matcher on synthetic
+forms and checks they agree on fields that carry their page.
+
+    python -m benchmarks.bench_dataset_proximity
+"""
+import random
+import time
+
+from services.ml_services.spatial_index import match_fields_on_pages
+
+PAGE_WIDTH, PAGE_HEIGHT = 612.0, 792.0
+
+
+def synthetic_form(pages, fields_per_page, words_per_page, seed=0):
+    rng = random.Random(seed)
+    page_words = []
+    fields = []
+    for page_num in range(pages):
+        texts, x0, y0, x1, y1 = [], [], [], [], []
+        for word_num in range(words_per_page):
+            left, top = rng.uniform(0, PAGE_WIDTH - 60), rng.uniform(0, PAGE_HEIGHT - 12)
+            texts.append(f"w{page_num}_{word_num}")
+            x0.append(left)
+            y0.append(top)
+            x1.append(left + rng.uniform(10, 60))
+            y1.append(top + 10)
+        page_words.append((texts, x0, y0, x1, y1))
+        for field_num in range(fields_per_page):
+            left, top = rng.uniform(0, PAGE_WIDTH - 200), rng.uniform(0, PAGE_HEIGHT - 20)
+            fields.append({
+                "name": f"field_{page_num}_{field_num}",
+                "rect": [left, top, left + rng.uniform(60, 200), top + 18],
+                "page": page_num,
+            })
+    return page_words, fields
+
+
+def legacy_match(pages, fields, margin=20):
+    # The original nested loop, restricted to each field's own page
+    nearby_text = []
+    for page_num, (texts, x0s, y0s, x1s, y1s) in enumerate(pages):
+        for field in fields:
+            if field["page"] != page_num:
+                continue
+            field_rect = field["rect"]
+            for text, x0, y0, x1, y1 in zip(texts, x0s, y0s, x1s, y1s):
+                if (
+                        x0 >= field_rect[0] - margin and x1 <= field_rect[2] + margin and
+                        y0 >= field_rect[1] - margin and y1 <= field_rect[3] + margin
+                ):
+                    nearby_text.append({"field": field["name"], "page": page_num + 1, "text": text})
+    return nearby_text
+
+
+def unrestricted_legacy_match(pages, fields, margin=20):
+    # The original nested loop exactly: every field against every page
+    nearby_text = []
+    for page_num, (texts, x0s, y0s, x1s, y1s) in enumerate(pages):
+        for field in fields:
+            field_rect = field["rect"]
+            for text, x0, y0, x1, y1 in zip(texts, x0s, y0s, x1s, y1s):
+                if (
+                        x0 >= field_rect[0] - margin and x1 <= field_rect[2] + margin and
+                        y0 >= field_rect[1] - margin and y1 <= field_rect[3] + margin
+                ):
+                    nearby_text.append({"field": field["name"], "page": page_num + 1, "text": text})
+    return nearby_text
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(f"{'pages':>6} {'fields':>7} {'words':>7} {'original':>10} {'per-page':>10} {'grid':>10}")
+    for pages in (10, 25, 50, 100):
+        page_words, fields = synthetic_form(pages, fields_per_page=30, words_per_page=400)
+        _, original_time = timed(unrestricted_legacy_match, page_words, fields)
+        expected, legacy_time = timed(legacy_match, page_words, fields)
+        actual, grid_time = timed(match_fields_on_pages, page_words, fields)
+        assert actual == expected, "grid index results differ from the nested loop"
+        print(f"{pages:>6} {len(fields):>7} {pages * 400:>7} "
+              f"{original_time:>9.3f}s {legacy_time:>9.3f}s {grid_time:>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
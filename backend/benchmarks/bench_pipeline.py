@@ -0,0 +1,222 @@
+"""
+End-to-end benchmarks of the document pipeline, with the LLM replaced by the
+deterministic stub backend (LLM_BACKEND=stub).
+
+    pip install -r requirements-dev.txt
+    python -m benchmarks.bench_pipeline --pages 10 --widgets 30 --iterations 10
+    python -m benchmarks.bench_pipeline --baseline benchmarks/results/<older>.json
+
+Benchmarks:
+- PDFProcessor stages: extract_fields, validate_fields and annotate_pdf on a
+  synthetic form read from local disk;
+- dataset.py: extract_document, extract_empty_fields, extract_text_near_fields
+  (and the OCR variant with --ocr, which needs the tesseract binary);
+- /process_pdf and /chat through an in-process ASGI client. These need a running
+  MinIO (MINIO_URL, ..., localhost:9000 with the default credentials if unset) and
+  use DATABASE_URL, or a temporary SQLite database if unset (through aiosqlite,
+  which is in requirements-dev.txt rather than the production requirements).
+
+Throughput, p50/p99 latency and peak RSS per benchmark are written as JSON to
+--output (benchmarks/results/<commit>.json by default). Benchmarks that cannot run
+in the current environment are listed under "skipped" with the reason.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+
+from benchmarks.harness import run_benchmark, arun_benchmark, make_report, write_report, print_results, git_commit
+from benchmarks.synthetic_pdf import make_form_pdf
+
+
+class Suite:
+    def __init__(self):
+        self.results = {}
+        self.skipped = {}
+
+    def skip(self, names, error):
+        for name in names:
+            self.skipped[name] = f"{type(error).__name__}: {error}"
+            print(f"Skipping {name}: {self.skipped[name]}")
+
+    def run(self, name, benchmark):
+        print(f"Running {name}...")
+        try:
+            self.results[name] = benchmark()
+        except Exception as e:
+            self.skip([name], e)
+
+    async def arun(self, name, benchmark):
+        print(f"Running {name}...")
+        try:
+            self.results[name] = await benchmark()
+        except Exception as e:
+            self.skip([name], e)
+
+
+def configure_environment(args, workdir):
+    # Must run before any service module is imported: settings are read at import time
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["LLM_STUB_LATENCY"] = str(args.llm_latency)
+    os.environ.setdefault("LLM_STUB_TOKEN_LATENCY", "0")
+    # Measure the LLM path rather than hits of a verdict cache left over from the last run
+    os.environ.setdefault("VALIDATION_CACHE_ENABLED", "0")
+    os.environ.setdefault("BLOB_CACHE_DIR", os.path.join(workdir, "blobs"))
+    os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}")
+    # minio_service builds its client at import time and Minio(None) raises, which would skip
+    # every benchmark importing the pipeline; the client connects only on the first request
+    os.environ.setdefault("MINIO_URL", "localhost:9000")
+    os.environ.setdefault("MINIO_USER", "minioadmin")
+    os.environ.setdefault("MINIO_PASSWORD", "minioadmin")
+
+
+def bench_dataset(suite, args, pdf_path):
+    names = ["dataset.extract_document", "dataset.extract_empty_fields", "dataset.extract_text_near_fields"]
+    try:
+        from services.ml_services.dataset import (
+            extract_empty_fields,
+            extract_text_near_fields,
+            extract_text_near_fields_with_ocr,
+        )
+        from services.ml_services.extraction import extract_document
+    except Exception as e:
+        suite.skip(names, e)
+        return
+
+    widgets = args.pages * args.widgets
+    extraction = extract_document(pdf_path)
+    empty_fields = extraction.empty_fields()
+
+    suite.run(names[0], lambda: run_benchmark(
+        lambda _: extract_document(pdf_path), args.iterations, items=args.pages))
+    suite.run(names[1], lambda: run_benchmark(
+        lambda _: extract_empty_fields(pdf_path), args.iterations, items=widgets))
+    suite.run(names[2], lambda: run_benchmark(
+        lambda _: extract_text_near_fields(extraction, empty_fields), args.iterations, items=len(empty_fields)))
+    if args.ocr:
+        suite.run("dataset.extract_text_near_fields_with_ocr", lambda: run_benchmark(
+            lambda _: extract_text_near_fields_with_ocr(pdf_path, empty_fields),
+            max(1, args.iterations // 5), warmup=0, items=len(empty_fields)))
+
+
+def bench_stages(suite, args, pdf_path, workdir):
+    names = ["pdf_processor.extract_fields", "pdf_processor.validate_fields", "pdf_processor.annotate_pdf"]
+    try:
+        from services.ml_services.summarizator import PDFProcessor
+    except Exception as e:
+        suite.skip(names, e)
+        return
+
+    widgets = args.pages * args.widgets
+    output_path = os.path.join(workdir, "annotated.pdf")
+
+    def processor(*stages):
+        # A fresh processor on the local file (no MinIO), with the given stages already run
+        pdf_processor = PDFProcessor(os.path.basename(pdf_path), output_path)
+        pdf_processor.local_path = pdf_path
+        for stage in stages:
+            getattr(pdf_processor, stage)()
+        return pdf_processor
+
+    def timed_stage(stage):
+        def benchmark(pdf_processor):
+            try:
+                getattr(pdf_processor, stage)()
+            finally:
+                pdf_processor.close()
+        return benchmark
+
+    suite.run(names[0], lambda: run_benchmark(
+        timed_stage("extract_fields"), args.iterations, setup=processor, items=widgets))
+    suite.run(names[1], lambda: run_benchmark(
+        timed_stage("validate_fields"), args.iterations, setup=lambda: processor("extract_fields"), items=widgets))
+    suite.run(names[2], lambda: run_benchmark(
+        timed_stage("annotate_pdf"), args.iterations,
+        setup=lambda: processor("extract_fields", "validate_fields"), items=widgets))
+
+
+async def bench_endpoints(suite, args, pdf_path):
+    names = ["endpoint.process_pdf", "endpoint.chat"]
+    try:
+        import httpx
+        from main import app
+        from utils.db_utils import Base, database_engine
+
+        # Non-destructive: only creates the tables that are missing
+        async with database_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    except Exception as e:
+        suite.skip(names, e)
+        return
+
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        async def process_pdf(i):
+            response = await client.post("/process_pdf", data={"session_id": f"benchmark-{i}"}, files={
+                "user_document": (f"benchmark_{i}.pdf", pdf_bytes, "application/pdf"),
+                "instruction_document": ("benchmark_instructions.pdf", pdf_bytes, "application/pdf"),
+            })
+            response.raise_for_status()
+
+        async def chat(i):
+            response = await client.post("/chat", json={
+                "session_id": f"benchmark-chat-{i % args.concurrency}",
+                "user_query": "Which fields were filled in incorrectly and why?",
+            })
+            response.raise_for_status()
+
+        await suite.arun(names[0], lambda: arun_benchmark(
+            process_pdf, args.iterations, concurrency=args.concurrency, items=args.pages * args.widgets))
+        await suite.arun(names[1], lambda: arun_benchmark(
+            chat, args.iterations, concurrency=args.concurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks of the document pipeline.")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--widgets", type=int, default=30, help="widgets per page")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent requests in endpoint benchmarks")
+    parser.add_argument("--llm-latency", type=float, default=float(os.getenv("LLM_STUB_LATENCY", "0.05")),
+                        help="seconds the stub LLM takes per request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ocr", action="store_true", help="also benchmark the OCR proximity matcher")
+    parser.add_argument("--skip-endpoints", action="store_true")
+    parser.add_argument("--output", help="report path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        configure_environment(args, workdir)
+        pdf_path = os.path.join(workdir, "form.pdf")
+        make_form_pdf(pdf_path, args.pages, args.widgets, seed=args.seed)
+
+        suite = Suite()
+        bench_dataset(suite, args, pdf_path)
+        bench_stages(suite, args, pdf_path, workdir)
+        if not args.skip_endpoints:
+            asyncio.run(bench_endpoints(suite, args, pdf_path))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join("benchmarks", "results", f"{git_commit() or 'latest'}.json")
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    write_report(make_report(config, suite.results, suite.skipped), output)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print()
+    print_results(suite.results, baseline)
+    print(f"\nReport written to '{output}'.")
+
+
+if __name__ == "__main__":
+    main()
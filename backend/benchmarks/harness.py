@@ -0,0 +1,159 @@
+"""
+Timing, memory and report helpers shared by the benchmarks.
+"""
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss():
+    # Resident set size in bytes; /proc is Linux only, ru_maxrss is the fallback
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakMemory:
+    """
+    Samples the RSS in a background thread while the block runs. ru_maxrss only ever
+    grows over the life of the process, so it cannot tell benchmarks apart.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.baseline = 0
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def summarize(latencies, wall_seconds, items, memory):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {
+        "iterations": len(latencies),
+        "throughput_per_s": len(latencies) / wall_seconds if wall_seconds else 0.0,
+        "items_per_s": len(latencies) * items / wall_seconds if wall_seconds else 0.0,
+        "mean_ms": float(np.mean(latencies)) * 1000,
+        "p50_ms": float(p50) * 1000,
+        "p99_ms": float(p99) * 1000,
+        "peak_rss_mb": memory.peak / 2 ** 20,
+        "rss_growth_mb": (memory.peak - memory.baseline) / 2 ** 20,
+    }
+
+
+def run_benchmark(func, iterations=10, warmup=1, setup=None, items=1):
+    """
+    Calls func(setup()) iterations times after warmup untimed calls. setup runs outside
+    the timed region. items is the work per call (fields, pages, ...) for items_per_s.
+    """
+    for _ in range(warmup):
+        func(setup() if setup else None)
+
+    latencies = []
+    with PeakMemory() as memory:
+        for _ in range(iterations):
+            argument = setup() if setup else None
+            start = time.perf_counter()
+            func(argument)
+            latencies.append(time.perf_counter() - start)
+    return summarize(latencies, sum(latencies), items, memory)
+
+
+async def arun_benchmark(func, iterations=10, warmup=1, concurrency=1, items=1):
+    """
+    Awaits func(i) iterations times, at most `concurrency` at once. Throughput is over
+    the wall time of the whole run, latencies are per call.
+    """
+    for i in range(warmup):
+        await func(-1 - i)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await func(i)
+            latencies.append(time.perf_counter() - start)
+
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        await asyncio.gather(*(timed(i) for i in range(iterations)))
+        wall_seconds = time.perf_counter() - start
+    return summarize(latencies, wall_seconds, items, memory)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_report(config, results, skipped):
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config,
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def write_report(report, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def print_results(results, baseline=None):
+    """
+    One line per benchmark; with a baseline report, the p50 and throughput change too.
+    """
+    previous = (baseline or {}).get("results", {})
+    print(f"{'benchmark':<32} {'ops/s':>9} {'items/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>8}"
+          + (f" {'p50 vs base':>12} {'ops/s vs base':>14}" if baseline else ""))
+    for name, result in results.items():
+        line = (f"{name:<32} {result['throughput_per_s']:>9.2f} {result['items_per_s']:>10.1f} "
+                f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['peak_rss_mb']:>8.1f}")
+        if name in previous:
+            before = previous[name]
+            p50_change = result["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+            throughput_change = (result["throughput_per_s"] / before["throughput_per_s"] - 1
+                                 if before["throughput_per_s"] else 0.0)
+            line += f" {p50_change:>+11.1%} {throughput_change:>+13.1%}"
+        print(line)
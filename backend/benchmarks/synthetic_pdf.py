@@ -0,0 +1,82 @@
+"""
+Synthetic fillable PDF forms for the benchmarks.
+
+Every widget gets a printed label just above it (so the proximity matchers have
+words to find) and, depending on fill_ratio, a value. Values mix well-formed and broken
+dates, emails, phone numbers and postcodes with free-text fields, so both the local
+rules and the LLM path of validation get work. The same seed gives the same file.
+
+    python -m benchmarks.synthetic_pdf out.pdf --pages 10 --widgets 30
+"""
+import argparse
+import math
+import random
+
+import fitz
+
+PAGE_WIDTH, PAGE_HEIGHT = 612.0, 792.0
+PAGE_MARGIN = 36.0
+COLUMNS = 2
+
+# (label, widget type, candidate values)
+FIELD_KINDS = [
+    ("Name", fitz.PDF_WIDGET_TYPE_TEXT, ["Jana Nováková", "Peter Horváth", "12345", "John Smith"]),
+    ("Date of birth", fitz.PDF_WIDGET_TYPE_TEXT, ["12.05.1990", "31.02.2001", "1985-11-23", "yesterday"]),
+    ("Email", fitz.PDF_WIDGET_TYPE_TEXT, ["jana@example.com", "peter.horvath@example.sk", "not an email"]),
+    ("Phone", fitz.PDF_WIDGET_TYPE_TEXT, ["+421 900 123 456", "0905 111 222", "call me"]),
+    ("Postcode", fitz.PDF_WIDGET_TYPE_TEXT, ["811 01", "04001", "SW1A 1AA"]),
+    ("Address", fitz.PDF_WIDGET_TYPE_TEXT, ["Hlavná 12, Bratislava", "Main Street 5", "???"]),
+    ("Occupation", fitz.PDF_WIDGET_TYPE_TEXT, ["Engineer", "Teacher", "42"]),
+    ("Place of birth", fitz.PDF_WIDGET_TYPE_TEXT, ["Košice", "Vienna", "Mars"]),
+    ("Consent", fitz.PDF_WIDGET_TYPE_CHECKBOX, [True, False]),
+]
+
+
+def make_form_pdf(path, pages=10, widgets_per_page=30, fill_ratio=0.8, seed=0):
+    """
+    Writes a pages x widgets_per_page form to path and returns the number of widgets.
+    """
+    rng = random.Random(seed)
+    rows = max(1, math.ceil(widgets_per_page / COLUMNS))
+    column_width = (PAGE_WIDTH - 2 * PAGE_MARGIN) / COLUMNS
+    row_height = (PAGE_HEIGHT - 2 * PAGE_MARGIN) / rows
+    font_size = min(9.0, row_height / 3)
+    widget_height = min(18.0, row_height - font_size - 4)
+
+    with fitz.open() as pdf_document:
+        for page_num in range(pages):
+            page = pdf_document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            for widget_num in range(widgets_per_page):
+                label, field_type, values = FIELD_KINDS[(page_num + widget_num) % len(FIELD_KINDS)]
+                left = PAGE_MARGIN + (widget_num % COLUMNS) * column_width
+                top = PAGE_MARGIN + (widget_num // COLUMNS) * row_height
+                page.insert_text((left, top + font_size), f"{label}:", fontsize=font_size)
+                top += font_size + 2
+
+                widget = fitz.Widget()
+                widget.field_name = f"{label} {page_num + 1}.{widget_num + 1}"
+                widget.field_type = field_type
+                widget.rect = fitz.Rect(left, top, left + column_width - 10, top + widget_height)
+                if field_type == fitz.PDF_WIDGET_TYPE_CHECKBOX:
+                    widget.field_value = rng.choice(values)
+                else:
+                    widget.field_value = rng.choice(values) if rng.random() < fill_ratio else ""
+                page.add_widget(widget)
+        pdf_document.save(path, garbage=3, deflate=True)
+    return pages * widgets_per_page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--widgets", type=int, default=30, help="widgets per page")
+    parser.add_argument("--fill-ratio", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    count = make_form_pdf(args.path, args.pages, args.widgets, args.fill_ratio, args.seed)
+    print(f"Wrote {count} widgets on {args.pages} pages to '{args.path}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,30 @@
-from fastapi import APIRouter
-from services.history_service import get_history_by_username
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from pydantic import BaseModel
+from services.history_service import get_history_by_username, get_history_page, add_history
 
 chat_history_router = APIRouter()
 
+
+class HistoryRequest(BaseModel):
+    chat_name: str
+
+
 @chat_history_router.get("/chat_history")
 async def get_chat_history():
-    return await get_history_by_username("test_user")
\ No newline at end of file
+    return await get_history_by_username("test_user")
+
+
+@chat_history_router.get("/v2/chat_history")
+async def get_chat_history_page(before_id: Optional[int] = None, limit: int = Query(50, ge=1, le=200)):
+    """
+    One page of the history, newest first, as {"items": [...], "next_before_id": id}.
+    Pass next_before_id as before_id to get the following page.
+    """
+    return await get_history_page("test_user", before_id, limit)
+
+
+@chat_history_router.post("/chat_history")
+async def add_chat_history(request: HistoryRequest):
+    return await add_history("test_user", request.chat_name)
@@ -0,0 +1,66 @@
+import os
+from fastapi.responses import FileResponse
+
+from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from services.job_service import JOB_QUEUE, JobQueueFullError
+from services.minio_service import upload_files_to_minio
+
+job_router = APIRouter()
+
+
+def get_job_or_404(job_id):
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@job_router.post("/jobs", status_code=202)
+async def submit_job(user_document: UploadFile = File(...), instruction_document: UploadFile = File(...),
+                     session_id: Optional[str] = Form(None)):
+    """
+    Uploads the documents and queues them for processing; returns immediately with a job id.
+    """
+    if user_document.content_type != 'application/pdf' or instruction_document.content_type != 'application/pdf':
+        raise HTTPException(status_code=400, detail="Both files must be PDFs")
+
+    documents = [user_document, instruction_document]
+    for document, err in zip(documents, await upload_files_to_minio(documents)):
+        if err is not None:
+            raise HTTPException(status_code=500, detail=f"Failed to upload {document.filename}: {str(err)}")
+
+    try:
+        job = JOB_QUEUE.submit(user_document.filename, session_id, instruction_document.filename)
+    except JobQueueFullError as err:
+        raise HTTPException(status_code=503, detail=str(err))
+    return job.to_dict()
+
+
+@job_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    return get_job_or_404(job_id).to_dict()
+
+
+@job_router.get("/jobs/{job_id}/knowledge_base")
+async def get_job_knowledge_base(job_id: str):
+    job = get_job_or_404(job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job.knowledge_base
+
+
+@job_router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = get_job_or_404(job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Job failed: {job.error}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if not os.path.exists(job.output_path):
+        raise HTTPException(status_code=404, detail="No annotated file was produced")
+    return FileResponse(
+        path=job.output_path,
+        media_type="application/pdf",
+        filename="new_with_anomalies.pdf"
+    )
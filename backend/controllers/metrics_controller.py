@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from utils.metrics import METRICS
+from utils.profiler import PROFILE_STORE
+
+metrics_router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@metrics_router.get("/metrics")
+async def metrics():
+    """
+    Stage timings, pipeline/LLM counters and endpoint latency histograms of this worker
+    in the Prometheus text format.
+    """
+    return PlainTextResponse(METRICS.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@metrics_router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """
+    Folded stacks of a request profiled with "X-Profile: 1" (PROFILING_ENABLED=1),
+    ready for flamegraph.pl or speedscope.
+    """
+    profile = PROFILE_STORE.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile["folded"], headers={
+        "X-Profile-Path": profile["path"],
+        "X-Profile-Duration": f"{profile['duration_s']:.6f}",
+        "X-Profile-Samples": str(profile["samples"]),
+    })
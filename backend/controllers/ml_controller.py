@@ -1,9 +1,15 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import Optional
 import os
-from fastapi.responses import FileResponse
+import json
+import time
+from fastapi.responses import FileResponse, StreamingResponse
 
-from services.ml_services.summarizator import PDFProcessor, ChatProcessor
+from services.blob_cache import BLOB_CACHE
+from services.chat_service import ChatService
+from services.ml_services.field_rules import RULE_STATS
+from services.ml_services.validation_cache import get_verdict_cache
 
 ml_router = APIRouter()
 
@@ -13,17 +19,22 @@ output_pdf_path = "services/ml_services/docs/new_with_anomalies.pdf"
 knowledge_base_path = "services/ml_services/docs/knowledge_base.json"
 openai_api_key = os.getenv("OPENAI_API")
 
-# Initialize processors
-processor = PDFProcessor(pdf_path, output_pdf_path)
+# Initialize processors. The chat processor and the ML modules behind it (fitz, openai)
+# are loaded on the first request, not at startup
+chat_service = ChatService(knowledge_base_path)
 
 
 class ChatRequest(BaseModel):
     session_id: str
     user_query: str
+    document_id: Optional[str] = None  # Defaults to the session's latest processed document
 
 
 # @ml_router.get("/get_processed_doc")
 async def get_processed_doc():
+    from services.ml_services.summarizator import PDFProcessor
+
+    processor = PDFProcessor(pdf_path, output_pdf_path)
     processor.process_pdf()
     file_path = output_pdf_path
     if os.path.exists(file_path):
@@ -41,6 +52,77 @@ async def chat_with_pdf(request: ChatRequest):
     """
     Interact with the assistant using session memory.
     """
-    chat_processor = ChatProcessor(knowledge_base_path)
-    response = chat_processor.get_response(request.user_query, request.session_id)
+    response = await chat_service.respond(request.session_id, request.user_query, request.document_id)
     return {"response": response}
+
+
+@ml_router.post("/chat/stream")
+async def chat_with_pdf_stream(request: ChatRequest):
+    """
+    Same as /chat, but forwards the answer token by token as server-sent events.
+    The final "done" event carries the time to first token and the total latency.
+    """
+    received_at = time.perf_counter()
+
+    async def events():
+        first_byte_at = None
+        async for event, data in chat_service.respond_stream(
+                request.session_id, request.user_query, request.document_id):
+            if first_byte_at is None:
+                first_byte_at = time.perf_counter()
+            if event == "done":
+                data["time_to_first_byte_ms"] = (first_byte_at - received_at) * 1000
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@ml_router.get("/validation_cache/stats")
+async def validation_cache_stats():
+    """
+    Hit/miss counters of the field verdict cache.
+    """
+    cache = get_verdict_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@ml_router.get("/validation_rules/stats")
+async def validation_rules_stats():
+    """
+    Share of fields resolved by the local rules and the estimated LLM time saved.
+    """
+    return RULE_STATS.stats()
+
+
+@ml_router.get("/instruction_rules/stats")
+async def instruction_rules_stats():
+    """
+    How often compiled instruction documents were reused instead of parsed again.
+    """
+    from services.instruction_service import INSTRUCTION_RULES_STORE
+
+    return INSTRUCTION_RULES_STORE.stats()
+
+
+@ml_router.get("/llm_client/stats")
+async def llm_client_stats():
+    """
+    Request, retry, rate-limit and deduplication counters of the shared LLM client.
+    """
+    from services.ml_services.llm_client import get_llm_client
+
+    return get_llm_client().stats()
+
+
+@ml_router.get("/blob_cache/stats")
+async def blob_cache_stats():
+    """
+    Hit rate and bytes saved by the local MinIO blob cache.
+    """
+    return BLOB_CACHE.stats()
@@ -1,39 +1,183 @@
+import json
 import os
-from fastapi.responses import FileResponse
+import uuid
+from fastapi.responses import FileResponse, StreamingResponse
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from services.minio_service import upload_file_to_minio
-from services.ml_services.summarizator import PDFProcessor
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Form, HTTPException
+from services.batch_service import BATCHES, DocumentBatch, BatchInputError
+from services.minio_service import (
+    annotated_object_name,
+    upload_annotated_pdf,
+    upload_files_to_minio,
+    stat_file_in_minio,
+    stream_file_from_minio,
+)
+from utils.environment_variables import (
+    ANNOTATED_OUTPUT_MODE,
+    ANNOTATED_OUTPUT_COMPRESS,
+    ANNOTATED_OUTPUT_DIR,
+    ANNOTATED_OUTPUT_CHUNK_SIZE,
+    ANNOTATED_OUTPUT_UPLOAD,
+)
+from utils.worker_pool import PIPELINE_LIMITER, PipelineBusyError, run_in_thread, iterate_in_thread
 
 upload_pdf_router = APIRouter()
 
+RESULT_FILENAME = "new_with_anomalies.pdf"
+
+
+async def iterate_chunks(data, chunk_size=ANNOTATED_OUTPUT_CHUNK_SIZE):
+    # Slices of the in-memory PDF, sent without copying
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
 @upload_pdf_router.post("/process_pdf")
-async def upload_pdfs(user_document: UploadFile = File(...), instruction_document: UploadFile = File(...)):
+async def upload_pdfs(background_tasks: BackgroundTasks, user_document: UploadFile = File(...),
+                      instruction_document: UploadFile = File(...), session_id: Optional[str] = Form(None)):
+    # Imported on first use: the ML stack (fitz, openai) would otherwise load at startup
+    from services.ml_services.summarizator import PDFProcessor
+
     # Validate the uploaded files are PDFs
     if user_document.content_type != 'application/pdf' or instruction_document.content_type != 'application/pdf':
         raise HTTPException(status_code=400, detail="Both files must be PDFs")
 
-    try:
-        await upload_file_to_minio(user_document)
-    except Exception as err:
-        raise HTTPException(status_code=500, detail=f"Failed to upload {user_document.filename}: {str(err)}")
+    documents = [user_document, instruction_document]
+    for document, err in zip(documents, await upload_files_to_minio(documents)):
+        if err is not None:
+            raise HTTPException(status_code=500, detail=f"Failed to upload {document.filename}: {str(err)}")
 
+    # The annotated PDF stays in memory, or (incremental mode) goes to a spool file of
+    # this request only, so concurrent requests never share an output file
+    output_file_path = None
+    if ANNOTATED_OUTPUT_MODE == "incremental":
+        os.makedirs(ANNOTATED_OUTPUT_DIR, exist_ok=True)
+        output_file_path = os.path.join(ANNOTATED_OUTPUT_DIR, f"{uuid.uuid4().hex}.pdf")
+
+    processor = PDFProcessor(user_document.filename, output_file_path, session_id=session_id,
+                             incremental_save=output_file_path is not None, compress_output=ANNOTATED_OUTPUT_COMPRESS,
+                             instructions_path=instruction_document.filename)
     try:
-        await upload_file_to_minio(instruction_document)
-    except Exception as err:
-        raise HTTPException(status_code=500, detail=f"Failed to upload {instruction_document.filename}: {str(err)}")
-
-    output_file_path = "check.pdf"
-    processor = PDFProcessor(user_document.filename, output_file_path)
-    processor.process_pdf()
-    if os.path.exists(output_file_path):
+        async with PIPELINE_LIMITER.slot():
+            await processor.process_pdf_async()
+    except PipelineBusyError as err:
+        raise HTTPException(status_code=503, detail=str(err))
+    except Exception:
+        if output_file_path is not None:
+            remove_file(output_file_path)
+        raise
+
+    headers = {"X-Document-Id": processor.document_id}
+    if output_file_path is not None and os.path.exists(output_file_path):
+        # Background tasks run after the response has been sent: store the result, then drop the spool file
+        if ANNOTATED_OUTPUT_UPLOAD:
+            background_tasks.add_task(run_in_thread, upload_annotated_pdf, processor.document_id, None,
+                                      output_file_path)
+        background_tasks.add_task(remove_file, output_file_path)
         return FileResponse(
             path=output_file_path,
             media_type="application/pdf",
-            filename="new_with_anomalies.pdf"
+            filename=RESULT_FILENAME,
+            headers=headers,
         )
-    else:
-        raise HTTPException(status_code=404, detail="File not found")
+    if processor.annotated_pdf is not None:
+        if ANNOTATED_OUTPUT_UPLOAD:
+            background_tasks.add_task(run_in_thread, upload_annotated_pdf, processor.document_id,
+                                      processor.annotated_pdf)
+        headers["Content-Length"] = str(len(processor.annotated_pdf))
+        headers["Content-Disposition"] = f'attachment; filename="{RESULT_FILENAME}"'
+        return StreamingResponse(
+            iterate_chunks(processor.annotated_pdf),
+            media_type="application/pdf",
+            headers=headers,
+        )
+    raise HTTPException(status_code=404, detail="File not found")
 
 
     # return {"message": "Successfully uploaded both PDF files.", "files": [user_document.filename, instruction_document.filename]}
+
+
+@upload_pdf_router.post("/process_pdf/batch")
+async def upload_pdf_batch(user_documents: List[UploadFile] = File(...),
+                           instruction_document: Optional[UploadFile] = File(None),
+                           session_id: Optional[str] = Form(None)):
+    """
+    Processes many user documents (PDFs and/or ZIP archives of PDFs) against one
+    instruction document. Streams one JSON line per document as it finishes, with its
+    knowledge base and the URL of its annotated PDF, then a summary line.
+
+    The batch runs in the background: if the client disconnects it keeps going, and
+    its progress and results stay available from GET /process_pdf/batch/{X-Batch-Id}.
+    Only a server shutdown cancels the documents that are left.
+    """
+    instructions_path = None
+    if instruction_document is not None:
+        if instruction_document.content_type != 'application/pdf':
+            raise HTTPException(status_code=400, detail="The instruction document must be a PDF")
+        err = (await upload_files_to_minio([instruction_document]))[0]
+        if err is not None:
+            raise HTTPException(status_code=500, detail=f"Failed to upload {instruction_document.filename}: {str(err)}")
+        instructions_path = instruction_document.filename
+
+    # Spool everything before the stream starts, so a bad upload still gets a 400
+    batch = DocumentBatch(session_id=session_id, instructions_path=instructions_path)
+    try:
+        for document in user_documents:
+            await run_in_thread(batch.add_upload, document.filename, document.content_type, document.file)
+        if not batch.documents:
+            raise BatchInputError("The batch contains no PDF documents")
+    except BatchInputError as err:
+        await run_in_thread(batch.discard)
+        raise HTTPException(status_code=400, detail=str(err))
+    except Exception:
+        await run_in_thread(batch.discard)
+        raise
+
+    BATCHES.submit(batch)
+
+    async def lines():
+        async for result in batch.follow():
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Batch-Id": batch.id})
+
+
+@upload_pdf_router.get("/process_pdf/batch/{batch_id}")
+async def get_batch(batch_id: str):
+    """
+    Status of a batch and the results of the documents finished so far.
+    """
+    batch = BATCHES.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch.to_dict()
+
+
+@upload_pdf_router.get("/process_pdf/{document_id}/result")
+async def get_annotated_pdf(document_id: str):
+    """
+    Streams an earlier /process_pdf result back from MinIO.
+    """
+    object_name = annotated_object_name(document_id)
+    try:
+        stat = await run_in_thread(stat_file_in_minio, object_name)
+    except Exception:
+        raise HTTPException(status_code=404, detail="File not found")
+    return StreamingResponse(
+        iterate_in_thread(stream_file_from_minio, object_name, 0, 0, ANNOTATED_OUTPUT_CHUNK_SIZE),
+        media_type="application/pdf",
+        headers={
+            "Content-Length": str(stat.size),
+            "Content-Disposition": f'attachment; filename="{RESULT_FILENAME}"',
+            "X-Document-Id": document_id,
+        },
+    )
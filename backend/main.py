@@ -1,9 +1,20 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
 import asyncio
+import importlib
 
-from controllers import ml_controller, chat_history_controller, upload_pdf_controller
+from controllers import ml_controller, chat_history_controller, upload_pdf_controller, job_controller, metrics_controller
+from services.batch_service import BATCHES
+from services.job_service import JOB_QUEUE
+from services.minio_service import ensure_bucket, check_minio
 from utils import create_db_tables
+from utils.db_utils import database_engine
+from utils.environment_variables import DATABASE_SETUP_ON_STARTUP, PRELOAD_ML_MODULES, READINESS_TIMEOUT
+from utils.metrics import RequestMetricsMiddleware
+from utils.profiler import ProfilerMiddleware
+from utils.worker_pool import run_in_thread, shutdown_process_pool, shutdown_stream_pool
 
 app = FastAPI()
 
@@ -14,16 +25,96 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Document-Id", "X-Batch-Id", "X-Profile-Id"],
 )
 
+# Endpoint latency histograms (GET /metrics) and opt-in per-request profiles
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+
 app.include_router(chat_history_controller.chat_history_router)
 app.include_router(upload_pdf_controller.upload_pdf_router)
 app.include_router(ml_controller.ml_router)
+app.include_router(job_controller.job_router)
+app.include_router(metrics_controller.metrics_router)
+
+# Heavy modules (fitz, openai, ...) that the routes import on first use
+ML_MODULES = ["services.ml_services.summarizator"]
+
+
+async def prepare_bucket():
+    # MinIO being down must not keep the API from starting; uploads retry the bucket check
+    try:
+        await run_in_thread(ensure_bucket)
+    except Exception as e:
+        print(f"MinIO is not available yet: {e}")
+
 
-# Startup event to initialize the database
+async def preload_ml_modules():
+    try:
+        for module in ML_MODULES:
+            await run_in_thread(importlib.import_module, module)
+    except Exception as e:
+        print(f"Failed to preload the ML modules: {e}")
+
+
+# Startup event to initialize the database (idempotent: existing tables and rows are kept;
+# serialised across workers) and the MinIO bucket, concurrently
 @app.on_event("startup")
 async def on_startup():
-    await create_db_tables.main()
+    if DATABASE_SETUP_ON_STARTUP:
+        await asyncio.gather(create_db_tables.main(), prepare_bucket())
+    else:
+        await prepare_bucket()
+    await JOB_QUEUE.start()
+    if PRELOAD_ML_MODULES:
+        # Load the ML stack while already serving, so the first request does not pay for it
+        app.state.preload = asyncio.create_task(preload_ml_modules())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    from services.ml_services.llm_client import close_llm_client
+
+    await JOB_QUEUE.stop()
+    await BATCHES.stop()
+    shutdown_process_pool()
+    shutdown_stream_pool()
+    close_llm_client()
+
+
+async def check_database():
+    async with database_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def check(name, probe):
+    try:
+        await asyncio.wait_for(probe(), READINESS_TIMEOUT)
+        return name, "ok"
+    except Exception as e:
+        return name, f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+
+@app.get("/health")
+async def health():
+    """
+    Liveness: the process is up and serving. Dependencies are checked by /ready.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: the database and MinIO answer, checked concurrently. 503 if either does not.
+    """
+    checks = dict(await asyncio.gather(
+        check("database", check_database),
+        check("minio", lambda: run_in_thread(check_minio)),
+    ))
+    is_ready = all(status == "ok" for status in checks.values())
+    return JSONResponse(status_code=200 if is_ready else 503,
+                        content={"status": "ready" if is_ready else "not ready", "checks": checks})
 
 @app.get("/")
 async def root():
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, Text, Index, ForeignKey
+
+from utils.db_utils import Base
+
+class Anomaly(Base):
+    __tablename__ = 'anomaly'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    document_id = Column(String, ForeignKey('document.id', ondelete='CASCADE'), nullable=False)
+    field_name = Column(String, nullable=False)
+    field_value = Column(Text, nullable=False)
+    reason = Column(Text, nullable=False)
+    page_number = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('ix_anomaly_document_id_id', 'document_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            "field_name": self.field_name,
+            "field_value": self.field_value,
+            "reason": self.reason,
+            "page_number": self.page_number,
+        }
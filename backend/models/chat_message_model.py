@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func
+
+from utils.db_utils import Base
+
+class ChatMessage(Base):
+    __tablename__ = 'chat_message'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # Session history is always read in insertion order, optionally after a known id
+        Index('ix_chat_message_session_id_id', 'session_id', 'id'),
+    )
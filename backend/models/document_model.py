@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, DateTime, Index, func
+
+from utils.db_utils import Base
+
+class Document(Base):
+    __tablename__ = 'document'
+
+    id = Column(String, primary_key=True)
+    session_id = Column(String, nullable=True)
+    filename = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_document_session_id_created_at', 'session_id', 'created_at'),
+    )
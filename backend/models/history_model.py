@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Index
 
 from utils.db_utils import Base
 
@@ -8,3 +8,15 @@ class History(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     username = Column(String, nullable=False)
     chat_name = Column(String, nullable=False)
+
+    __table_args__ = (
+        # Serves the per-user keyset pagination (username = ? AND id < ? ORDER BY id DESC)
+        Index('ix_history_username_id', 'username', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "username": self.username,
+            "chat_name": self.chat_name,
+        }
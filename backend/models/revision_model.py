@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func
+
+from utils.db_utils import Base
+
+class DocumentRevision(Base):
+    __tablename__ = 'document_revision'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    owner = Column(String, nullable=False)  # Session id, or '' for anonymous uploads
+    filename = Column(String, nullable=False)
+    fingerprint = Column(String, nullable=False)  # Hash of the widget set (names, pages, rects, types)
+    document_id = Column(String, nullable=False)
+    verdicts = Column(Text, nullable=False)  # JSON: field key -> [field value, verdict]
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_document_revision_owner_filename_fingerprint', 'owner', 'filename', 'fingerprint', unique=True),
+    )
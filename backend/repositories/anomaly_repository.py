@@ -0,0 +1,58 @@
+from sqlalchemy import insert
+from sqlalchemy.future import select
+
+from models.anomaly_model import Anomaly
+from models.document_model import Document
+from utils.db_utils import async_session
+
+async def add_document_anomalies(document_id: str, session_id: str, filename: str, entries: list[dict]) -> None:
+    async with async_session() as session:
+        async with session.begin():
+            session.add(Document(id=document_id, session_id=session_id, filename=filename))
+            await session.flush()
+            if not entries:
+                return
+            # One executemany round-trip for the whole document
+            await session.execute(insert(Anomaly), [
+                {
+                    "document_id": document_id,
+                    "field_name": entry["field_name"],
+                    "field_value": entry["field_value"],
+                    "reason": entry["reason"],
+                    "page_number": entry["page_number"],
+                }
+                for entry in entries
+            ])
+
+async def get_document_anomalies(document_id: str) -> list[Anomaly]:
+    async with async_session() as session:
+        result = await session.execute(
+            select(Anomaly).where(Anomaly.document_id == document_id).order_by(Anomaly.id)
+        )
+        return result.scalars().all()
+
+async def document_exists(document_id: str) -> bool:
+    async with async_session() as session:
+        result = await session.execute(select(Document.id).where(Document.id == document_id))
+        return result.scalar_one_or_none() is not None
+
+async def get_latest_anonymous_document_id():
+    # Uploads sent without a session_id; served by the (session_id, created_at) index
+    async with async_session() as session:
+        result = await session.execute(
+            select(Document.id)
+            .where(Document.session_id.is_(None))
+            .order_by(Document.created_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+async def get_latest_session_document_id(session_id: str):
+    async with async_session() as session:
+        result = await session.execute(
+            select(Document.id)
+            .where(Document.session_id == session_id)
+            .order_by(Document.created_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
@@ -0,0 +1,23 @@
+from sqlalchemy.future import select
+
+from models.chat_message_model import ChatMessage
+from utils.db_utils import async_session
+
+async def get_session_messages(session_id: str, after_id: int = 0) -> list[ChatMessage]:
+    async with async_session() as session:
+        result = await session.execute(
+            select(ChatMessage)
+            .where(ChatMessage.session_id == session_id, ChatMessage.id > after_id)
+            .order_by(ChatMessage.id)
+        )
+        return result.scalars().all()
+
+async def add_session_messages(session_id: str, messages: list[dict]) -> list[ChatMessage]:
+    async with async_session() as session:
+        async with session.begin():
+            rows = [
+                ChatMessage(session_id=session_id, role=message["role"], content=message["content"])
+                for message in messages
+            ]
+            session.add_all(rows)
+    return rows
@@ -1,13 +1,29 @@
+from typing import Optional
+
 from sqlalchemy.future import select
 
 from models.history_model import History
 from utils.db_utils import async_session
 
-async def get_user_history(username: str) -> list[History]:
+async def get_all_user_history(username: str) -> list[History]:
+    async with async_session() as session:
+        result = await session.execute(
+            select(History).where(History.username == username).order_by(History.id)
+        )
+        return result.scalars().all()
+
+async def get_user_history(username: str, before_id: Optional[int] = None, limit: int = 50) -> list[History]:
+    # Keyset pagination, newest first: an index range scan on (username, id) whatever the page
+    query = select(History).where(History.username == username)
+    if before_id is not None:
+        query = query.where(History.id < before_id)
+    async with async_session() as session:
+        result = await session.execute(query.order_by(History.id.desc()).limit(limit))
+        return result.scalars().all()
+
+async def add_user_history(username: str, chat_name: str) -> History:
     async with async_session() as session:
         async with session.begin():
-            result = await session.execute(
-                select(History).where(History.username == username)
-            )
-            user_history = result.scalars().all()
-    return user_history
\ No newline at end of file
+            row = History(username=username, chat_name=chat_name)
+            session.add(row)
+        return row
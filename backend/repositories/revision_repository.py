@@ -0,0 +1,43 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.future import select
+
+from models.revision_model import DocumentRevision
+from utils.db_utils import async_session, database_engine
+
+async def get_latest_revision(owner: str, filename: str, fingerprint: str):
+    async with async_session() as session:
+        result = await session.execute(
+            select(DocumentRevision)
+            .where(
+                DocumentRevision.owner == owner,
+                DocumentRevision.filename == filename,
+                DocumentRevision.fingerprint == fingerprint,
+            )
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+async def replace_revision(owner: str, filename: str, fingerprint: str, document_id: str, verdicts: str) -> None:
+    # Only the latest revision of a widget set is kept; one upsert, so concurrent uploads
+    # of the same form cannot both insert under the unique index
+    insert = sqlite_insert if database_engine.dialect.name == "sqlite" else postgresql_insert
+    statement = insert(DocumentRevision).values(
+        owner=owner,
+        filename=filename,
+        fingerprint=fingerprint,
+        document_id=document_id,
+        verdicts=verdicts,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[DocumentRevision.owner, DocumentRevision.filename, DocumentRevision.fingerprint],
+        set_={
+            "document_id": statement.excluded.document_id,
+            "verdicts": statement.excluded.verdicts,
+            "created_at": func.now(),
+        },
+    )
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(statement)
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+from repositories.anomaly_repository import (
+    add_document_anomalies,
+    document_exists,
+    get_document_anomalies,
+    get_latest_anonymous_document_id,
+    get_latest_session_document_id,
+)
+from services.ml_services.retrieval import KnowledgeBaseIndex
+from utils.environment_variables import ANOMALY_CACHE_SIZE
+
+
+class AnomalyStore:
+    """
+    Per-document knowledge bases persisted in Postgres, with a read-through LRU of
+    ready-built retrieval indexes. A document's anomalies never change once written,
+    so cached entries do not need invalidation. Documents that are not stored (yet),
+    e.g. a job still running or an unknown id, are not cached.
+    """
+
+    def __init__(self, max_documents=ANOMALY_CACHE_SIZE):
+        self.max_documents = max_documents
+        self.indexes = OrderedDict()  # document_id -> KnowledgeBaseIndex
+
+    def _cache(self, document_id, entries):
+        index = KnowledgeBaseIndex()
+        index.sync(entries)
+        self.indexes[document_id] = index
+        self.indexes.move_to_end(document_id)
+        while len(self.indexes) > self.max_documents:
+            self.indexes.popitem(last=False)
+        return index
+
+    async def save(self, document_id, session_id, filename, entries):
+        await add_document_anomalies(document_id, session_id, filename, entries)
+        self._cache(document_id, entries)
+
+    async def get_index(self, document_id) -> KnowledgeBaseIndex:
+        index = self.indexes.get(document_id)
+        if index is not None:
+            self.indexes.move_to_end(document_id)
+            return index
+        rows = await get_document_anomalies(document_id)
+        if not rows and not await document_exists(document_id):
+            return KnowledgeBaseIndex()
+        return self._cache(document_id, [row.to_dict() for row in rows])
+
+    async def get_entries(self, document_id) -> list[dict]:
+        return (await self.get_index(document_id)).ordered_entries()
+
+    async def document_for_session(self, session_id):
+        return await get_latest_session_document_id(session_id)
+
+    async def latest_anonymous_document(self):
+        return await get_latest_anonymous_document_id()
+
+
+ANOMALY_STORE = AnomalyStore()
@@ -0,0 +1,265 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+import zipfile
+
+from services.minio_service import upload_annotated_pdf
+from utils.environment_variables import (
+    JOB_RETENTION,
+    ANNOTATED_OUTPUT_COMPRESS,
+    ANNOTATED_OUTPUT_UPLOAD,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_DOCUMENTS,
+    BATCH_MAX_DOCUMENT_SIZE,
+    BATCH_SPOOL_DIR,
+)
+from utils.worker_pool import PIPELINE_LIMITER, run_in_thread
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "application/x-zip"}
+
+
+class BatchInputError(Exception):
+    pass
+
+
+def is_zip(filename, content_type):
+    return content_type in ZIP_CONTENT_TYPES or (filename or "").lower().endswith(".zip")
+
+
+class DocumentBatch:
+    """
+    Many user documents processed in one request against one instruction document.
+
+    Uploads (PDFs, or ZIP archives of PDFs) are spooled to a directory of the batch
+    and each document runs through the usual PDFProcessor stages from its local file,
+    without a MinIO round-trip. Up to `concurrency` documents are in flight at once,
+    so extraction of some overlaps validation of others; each also takes a slot of
+    the PIPELINE_LIMITER, so all batches and single uploads share its concurrency. All documents share one
+    SharedFieldValidator: a (field, value) pair found in several documents is
+    validated once.
+
+    Once submitted to BATCHES, a batch runs in the background: its results are kept
+    in `results` and followed by any number of clients, so a client that disconnects
+    does not stop it.
+    """
+
+    def __init__(self, session_id=None, instructions_path=None, concurrency=BATCH_CONCURRENCY,
+                 max_documents=BATCH_MAX_DOCUMENTS, max_document_size=BATCH_MAX_DOCUMENT_SIZE,
+                 spool_dir=BATCH_SPOOL_DIR, upload_results=ANNOTATED_OUTPUT_UPLOAD):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.instructions_path = instructions_path
+        self.concurrency = max(1, concurrency)
+        self.max_documents = max_documents
+        self.max_document_size = max_document_size
+        self.directory = os.path.join(spool_dir, self.id)
+        self.upload_results = upload_results
+        self.documents = []  # (filename, local path)
+        self.validator = None
+        self.failed = 0
+        self.status = "queued"  # queued -> running -> done | failed | cancelled
+        self.error = None
+        self.results = []  # One entry per finished document, then the summary
+        self.changed = asyncio.Event()  # Replaced by a new event on every change
+        self.task = None
+        self.updated_at = time.time()
+
+    def _spool_path(self, filename):
+        if len(self.documents) >= self.max_documents:
+            raise BatchInputError(f"A batch holds at most {self.max_documents} documents")
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{len(self.documents):06d}.pdf")
+        self.documents.append((filename, path))
+        return path
+
+    def _check_size(self, filename, size):
+        if size > self.max_document_size:
+            raise BatchInputError(f"'{filename}' is larger than {self.max_document_size} bytes")
+
+    def add_upload(self, filename, content_type, file_obj):
+        """
+        Spools one uploaded file: a PDF, or a ZIP archive whose PDF members become
+        documents of the batch (other members are skipped). Blocking; run in a thread.
+        """
+        if is_zip(filename, content_type):
+            self._add_archive(filename, file_obj)
+        elif content_type == "application/pdf":
+            file_obj.seek(0, os.SEEK_END)
+            self._check_size(filename, file_obj.tell())
+            file_obj.seek(0)
+            with open(self._spool_path(filename), "wb") as f:
+                shutil.copyfileobj(file_obj, f)
+        else:
+            raise BatchInputError(f"'{filename}' is neither a PDF nor a ZIP archive")
+
+    def _add_archive(self, filename, file_obj):
+        try:
+            with zipfile.ZipFile(file_obj) as archive:
+                for member in archive.infolist():
+                    name = member.filename
+                    if member.is_dir() or not name.lower().endswith(".pdf") or name.startswith("__MACOSX/"):
+                        continue
+                    # Size from the archive header; reading a member stops there, whatever the data says
+                    self._check_size(name, member.file_size)
+                    with archive.open(member) as source, open(self._spool_path(name), "wb") as target:
+                        shutil.copyfileobj(source, target)
+        except zipfile.BadZipFile as e:
+            raise BatchInputError(f"'{filename}' is not a valid ZIP archive: {e}")
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def _notify(self):
+        self.updated_at = time.time()
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def execute(self):
+        # The background task of a submitted batch
+        self.status = "running"
+        self._notify()
+        try:
+            async for result in self.run():
+                self.results.append(result)
+                self._notify()
+            self.status = "done"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        except Exception as e:
+            print(f"Batch {self.id} failed: {e}")
+            self.status, self.error = "failed", str(e)
+        finally:
+            self._notify()
+
+    async def follow(self):
+        """
+        Yields the results so far, then each new one until the batch has finished.
+        Closing the generator only stops following; the batch keeps running.
+        """
+        sent = 0
+        while True:
+            changed = self.changed
+            while sent < len(self.results):
+                yield self.results[sent]
+                sent += 1
+            if self.finished:
+                if self.status != "done":
+                    yield {"batch_id": self.id, "status": self.status, "error": self.error}
+                return
+            await changed.wait()
+
+    def to_dict(self):
+        return {
+            "batch_id": self.id,
+            "status": self.status,
+            "documents": len(self.documents),
+            "documents_finished": sum(1 for result in self.results if "summary" not in result),
+            "failed": self.failed,
+            "error": self.error,
+            "results": self.results,
+            "updated_at": self.updated_at,
+        }
+
+    async def run(self):
+        """
+        Yields one result per document as it finishes, in completion order, then a
+        summary. Closing the generator early cancels what is left.
+        """
+        # Imported here so that importing the controller does not load the ML stack
+        from services.ml_services.field_validator import FieldValidator, SharedFieldValidator
+        from services.ml_services.llm_client import get_llm_client
+
+        self.validator = SharedFieldValidator(FieldValidator(get_llm_client()))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started_at = time.perf_counter()
+        tasks = [
+            asyncio.create_task(self.process(semaphore, filename, path))
+            for filename, path in self.documents
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+            yield {"summary": {
+                "batch_id": self.id,
+                "documents": len(self.documents),
+                "failed": self.failed,
+                "seconds": time.perf_counter() - started_at,
+                **self.validator.stats(),
+            }}
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await run_in_thread(self.discard)
+
+    async def process(self, semaphore, filename, path):
+        from services.ml_services.summarizator import PDFProcessor
+
+        async with semaphore, PIPELINE_LIMITER.slot(wait=True):
+            processor = PDFProcessor(filename, None, session_id=self.session_id,
+                                     compress_output=ANNOTATED_OUTPUT_COMPRESS,
+                                     instructions_path=self.instructions_path, validator=self.validator)
+            processor.local_path = path
+            result = {"document_id": processor.document_id, "filename": filename}
+            try:
+                await processor.process_pdf_async()
+            except Exception as e:
+                print(f"Batch {self.id}: document '{filename}' failed: {e}")
+                self.failed += 1
+                return {**result, "status": "failed", "error": str(e)}
+            finally:
+                os.remove(path)
+
+            stored = False
+            if processor.annotated_pdf is not None and self.upload_results:
+                stored = await run_in_thread(upload_annotated_pdf, processor.document_id, processor.annotated_pdf)
+            return {
+                **result,
+                "status": "done",
+                "fields": len(processor.fields),
+                "fields_reused": processor.fields_reused,
+                "anomalies": len(processor.anomalous_fields),
+                "knowledge_base": processor.knowledge_base,
+                "annotated_pdf_url": f"/process_pdf/{processor.document_id}/result" if stored else None,
+            }
+
+
+class BatchRegistry:
+    """
+    Batches running in the background, and finished ones for JOB_RETENTION seconds,
+    for GET /process_pdf/batch/{batch_id}. Running batches are cancelled at shutdown.
+    """
+
+    def __init__(self):
+        self.batches = {}
+
+    def submit(self, batch):
+        self._prune()
+        self.batches[batch.id] = batch
+        batch.task = asyncio.create_task(batch.execute())
+        return batch
+
+    def get(self, batch_id):
+        return self.batches.get(batch_id)
+
+    async def stop(self):
+        tasks = [batch.task for batch in self.batches.values() if batch.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _prune(self):
+        expired_before = time.time() - JOB_RETENTION
+        for batch_id, batch in list(self.batches.items()):
+            if batch.finished and batch.updated_at < expired_before:
+                del self.batches[batch_id]
+
+
+BATCHES = BatchRegistry()
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+
+from services.minio_service import BUCKET_NAME, stat_file_in_minio, download_file_from_minio
+from utils.environment_variables import BLOB_CACHE_DIR, BLOB_CACHE_SIZE
+from utils.worker_pool import run_in_thread
+
+
+class BlobCache:
+    """
+    Size-bounded local disk cache of MinIO objects keyed on bucket/object/ETag.
+
+    A lookup costs one stat request; the object body only crosses the network when the
+    ETag is not cached yet. Least recently used files are evicted (by mtime, which is
+    bumped on every hit) once the directory grows past max_bytes. Files are written
+    under a temporary name and renamed, so several worker processes can share the
+    directory. A path returned with pin=True is not evicted by this process until it
+    is released, e.g. while a process pool worker still has to open it.
+    """
+
+    def __init__(self, directory=BLOB_CACHE_DIR, max_bytes=BLOB_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.pins = {}  # path -> number of users that have not released it yet
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def _path_for(self, file_name, etag):
+        key = hashlib.sha256(f"{BUCKET_NAME}/{file_name}/{etag}".encode("utf-8")).hexdigest()
+        return key, os.path.join(self.directory, f"{key}.blob")
+
+    def get_path(self, file_name, pin=False):
+        """
+        Returns a local path holding the current version of file_name. With pin=True the
+        caller must release(path) once it no longer reads the file.
+        """
+        stat = stat_file_in_minio(file_name)
+        key, path = self._path_for(file_name, stat.etag)
+
+        # One download per object version, even when several threads ask at once
+        with self._key_lock(key):
+            hit = os.path.exists(path)
+            if hit:
+                os.utime(path)
+            else:
+                partial_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+                download_file_from_minio(file_name, partial_path)
+                os.replace(partial_path, path)
+            if pin:
+                # Pinned before the key lock is let go, so no eviction can slip in between
+                with self.lock:
+                    self.pins[path] = self.pins.get(path, 0) + 1
+
+        with self.lock:
+            self.key_locks.pop(key, None)
+            if hit:
+                self.hits += 1
+                self.bytes_saved += stat.size
+            else:
+                self.misses += 1
+                self.bytes_downloaded += stat.size
+
+        if not hit:
+            self.evict()
+        return path
+
+    def release(self, path):
+        with self.lock:
+            count = self.pins.get(path, 0) - 1
+            if count > 0:
+                self.pins[path] = count
+            else:
+                self.pins.pop(path, None)
+
+    def read(self, file_name):
+        path = self.get_path(file_name, pin=True)
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            self.release(path)
+
+    async def aget_path(self, file_name, pin=False):
+        return await run_in_thread(self.get_path, file_name, pin)
+
+    async def aread(self, file_name):
+        return await run_in_thread(self.read, file_name)
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".blob"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        entries.sort()
+        with self.lock:
+            pinned = set(self.pins)
+        # Never evict a file still in use here, nor the most recently used one (it may be
+        # in use by another process sharing the directory, which keeps its own pins)
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            if path in pinned:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self.lock:
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "bytes_downloaded": self.bytes_downloaded,
+            "evictions": self.evictions,
+            "pinned": len(self.pins),
+        }
+
+
+BLOB_CACHE = BlobCache()
@@ -0,0 +1,161 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from repositories.chat_message_repository import get_session_messages, add_session_messages
+from services.anomaly_service import ANOMALY_STORE
+from utils.environment_variables import CHAT_SESSION_CACHE_SIZE
+from utils.worker_pool import run_in_thread, iterate_in_thread
+
+
+def history_key(session_id, document_id):
+    # A conversation belongs to a session and the document it is about; a new upload
+    # in the same session starts a new conversation
+    return session_id if document_id is None else f"{session_id}:{document_id}"
+
+
+class ChatSessionStore:
+    """
+    Chat histories persisted in Postgres with an in-memory LRU in front.
+
+    A cached session remembers the id of its last row, so a lookup only fetches
+    messages written after it (e.g. by another uvicorn worker) instead of the
+    whole history.
+    """
+
+    def __init__(self, max_sessions=CHAT_SESSION_CACHE_SIZE):
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # session_id -> {"last_id": int, "messages": [...]}
+
+    def _cached(self, session_id):
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            entry = {"last_id": 0, "messages": []}
+            self.sessions[session_id] = entry
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+        return entry
+
+    def _extend(self, entry, rows):
+        for row in rows:
+            if row.id > entry["last_id"]:
+                entry["messages"].append({"role": row.role, "content": row.content})
+                entry["last_id"] = row.id
+
+    async def load(self, session_id) -> list[dict]:
+        entry = self._cached(session_id)
+        self._extend(entry, await get_session_messages(session_id, entry["last_id"]))
+        return list(entry["messages"])
+
+    async def append(self, session_id, messages):
+        entry = self._cached(session_id)
+        self._extend(entry, await add_session_messages(session_id, messages))
+
+
+class ChatService:
+    """
+    Long-lived chat entry point: one ChatProcessor (on the shared LLM client) for the whole
+    process, with session histories kept in the ChatSessionStore.
+    """
+
+    def __init__(self, knowledge_base_path):
+        self.knowledge_base_path = knowledge_base_path
+        self.store = ChatSessionStore()
+        self.processor = None
+        self.session_locks = {}  # session_id -> [asyncio.Lock, number of requests using it]
+
+    def get_processor(self):
+        if self.processor is None:
+            # Imported on first use: the ML stack (fitz, openai) would otherwise load at startup
+            from services.ml_services.summarizator import ChatProcessor
+            self.processor = ChatProcessor(self.knowledge_base_path)
+        return self.processor
+
+    @asynccontextmanager
+    async def session_turn(self, session_id):
+        # Serialize turns of one session so concurrent requests do not interleave
+        lock_entry = self.session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+        lock_entry[1] += 1
+        try:
+            async with lock_entry[0]:
+                yield
+        finally:
+            lock_entry[1] -= 1
+            if lock_entry[1] == 0:
+                self.session_locks.pop(session_id, None)
+
+    async def knowledge_index(self, session_id, document_id=None):
+        """
+        Retrieval index of the requested document, else of the session's latest upload,
+        else of the latest upload sent without a session_id. Uploads of other sessions
+        are never used. Returns (document_id, index), both None (use the processor's
+        JSON knowledge base) when there is no such document.
+        """
+        if document_id is None:
+            document_id = await ANOMALY_STORE.document_for_session(session_id)
+        if document_id is None:
+            document_id = await ANOMALY_STORE.latest_anonymous_document()
+        if document_id is None:
+            self.get_processor().refresh_knowledge_base()
+            return None, None
+        return document_id, await ANOMALY_STORE.get_index(document_id)
+
+    async def respond(self, session_id, user_query, document_id=None):
+        processor = self.get_processor()
+        async with self.session_turn(session_id):
+            document_id, index = await self.knowledge_index(session_id, document_id)
+            key = history_key(session_id, document_id)
+            history = await self.store.load(key)
+            messages = processor.build_prompt(history, user_query, index)
+
+            try:
+                assistant_response = await run_in_thread(processor.complete, messages)
+            except Exception as e:
+                return f"Error during chat: {e}"
+
+            await self.store.append(key, [
+                {"role": "user", "content": user_query},
+                {"role": "assistant", "content": assistant_response},
+            ])
+            return assistant_response
+
+    async def respond_stream(self, session_id, user_query, document_id=None):
+        """
+        Yields ("token", text) as the completion arrives, then ("done", timings) once the
+        full answer has been stored in the session, or ("error", message) on failure.
+        """
+        processor = self.get_processor()
+        start = time.perf_counter()
+        first_token_at = None
+
+        async with self.session_turn(session_id):
+            document_id, index = await self.knowledge_index(session_id, document_id)
+            key = history_key(session_id, document_id)
+            history = await self.store.load(key)
+            messages = processor.build_prompt(history, user_query, index)
+
+            tokens = []
+            try:
+                async for token in iterate_in_thread(processor.stream, messages):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    tokens.append(token)
+                    yield "token", token
+            except Exception as e:
+                yield "error", f"Error during chat: {e}"
+                return
+
+            await self.store.append(key, [
+                {"role": "user", "content": user_query},
+                {"role": "assistant", "content": "".join(tokens).strip()},
+            ])
+
+        end = time.perf_counter()
+        timings = {
+            "time_to_first_token_ms": (first_token_at - start) * 1000 if first_token_at else None,
+            "total_ms": (end - start) * 1000,
+        }
+        print(f"Chat stream for session '{session_id}': {timings}")
+        yield "done", timings
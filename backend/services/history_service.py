@@ -1,5 +1,81 @@
-from models.history_model import History
-from repositories.history_repository import get_user_history
+import time
+from collections import OrderedDict
+from typing import Optional
 
-async def get_history_by_username(username: str) -> list[History]:
-    return await get_user_history(username)
+from repositories.history_repository import get_all_user_history, get_user_history, add_user_history
+from utils.environment_variables import HISTORY_CACHE_TTL, HISTORY_CACHE_SIZE, HISTORY_CACHE_PAGES
+
+
+class HistoryCache:
+    """
+    Short-lived per-user cache of history pages. Pages expire after `ttl` seconds and
+    all pages of a user are dropped when that user's history is written. A user keeps
+    at most `max_pages` pages; expired ones are pruned when a page is added.
+    """
+
+    def __init__(self, ttl=HISTORY_CACHE_TTL, max_users=HISTORY_CACHE_SIZE, max_pages=HISTORY_CACHE_PAGES):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_pages = max_pages
+        self.users = OrderedDict()  # username -> {(before_id, limit) or "all": (expires_at, page)}
+
+    def get(self, username, page_key):
+        entry = self.users.get(username, {}).get(page_key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        self.users.move_to_end(username)
+        return entry[1]
+
+    def put(self, username, page_key, page):
+        now = time.monotonic()
+        pages = self.users.setdefault(username, {})
+        for key in [key for key, (expires_at, _) in pages.items() if expires_at < now]:
+            del pages[key]
+        pages.pop(page_key, None)
+        while len(pages) >= self.max_pages:
+            # Oldest first: dicts keep insertion order
+            del pages[next(iter(pages))]
+        pages[page_key] = (now + self.ttl, page)
+        self.users.move_to_end(username)
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+
+    def invalidate(self, username):
+        self.users.pop(username, None)
+
+
+HISTORY_CACHE = HistoryCache()
+
+
+async def get_history_by_username(username: str) -> list[dict]:
+    # The whole history, oldest first: the response of GET /chat_history
+    history = HISTORY_CACHE.get(username, "all") if HISTORY_CACHE_TTL > 0 else None
+    if history is None:
+        history = [row.to_dict() for row in await get_all_user_history(username)]
+        if HISTORY_CACHE_TTL > 0:
+            HISTORY_CACHE.put(username, "all", history)
+    return history
+
+
+async def get_history_page(username: str, before_id: Optional[int] = None, limit: int = 50) -> dict:
+    """
+    One page of a user's history, newest first. next_before_id is passed as before_id
+    to get the following page; it is None on the last page.
+    """
+    page_key = (before_id, limit)
+    page = HISTORY_CACHE.get(username, page_key) if HISTORY_CACHE_TTL > 0 else None
+    if page is None:
+        rows = await get_user_history(username, before_id, limit)
+        page = {
+            "items": [row.to_dict() for row in rows],
+            "next_before_id": rows[-1].id if len(rows) == limit else None,
+        }
+        if HISTORY_CACHE_TTL > 0:
+            HISTORY_CACHE.put(username, page_key, page)
+    return page
+
+
+async def add_history(username: str, chat_name: str) -> dict:
+    row = await add_user_history(username, chat_name)
+    HISTORY_CACHE.invalidate(username)
+    return row.to_dict()
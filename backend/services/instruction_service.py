@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from services.blob_cache import BLOB_CACHE
+from services.ml_services.instruction_rules import InstructionRules, COMPILER_VERSION
+from services.ml_services.pdf_tasks import compile_instructions
+from utils.environment_variables import INSTRUCTION_CACHE_DIR, INSTRUCTION_CACHE_SIZE
+from utils.worker_pool import run_in_process, run_in_thread
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class InstructionRulesStore:
+    """
+    Compiled instruction documents keyed by the hash of their content. The same
+    instruction packet comes with many user documents, so it is parsed once and then
+    served from an in-memory LRU, or from its compiled JSON on disk after a restart.
+    Concurrent requests for a packet that is still compiling wait for that compile.
+    """
+
+    def __init__(self, directory=INSTRUCTION_CACHE_DIR, max_documents=INSTRUCTION_CACHE_SIZE):
+        self.directory = directory
+        self.max_documents = max_documents
+        self.rules = OrderedDict()  # content hash -> InstructionRules
+        self.hashes = OrderedDict()  # blob cache path (one per object version) -> content hash
+        self.compiling = {}  # content hash -> Future of the compile in progress
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "compiles": 0}
+
+    def _path_for(self, content_hash):
+        return os.path.join(self.directory, f"{content_hash}.json")
+
+    def _load(self, content_hash):
+        try:
+            with open(self._path_for(content_hash)) as f:
+                compiled = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return compiled["snippets"] if compiled.get("version") == COMPILER_VERSION else None
+
+    def _store(self, content_hash, snippets):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = f"{self._path_for(content_hash)}.{os.getpid()}.part"
+        with open(temporary_path, "w") as f:
+            json.dump({"version": COMPILER_VERSION, "snippets": snippets}, f)
+        os.replace(temporary_path, self._path_for(content_hash))
+
+    async def _content_hash(self, local_path):
+        content_hash = self.hashes.get(local_path)
+        if content_hash is None:
+            content_hash = await run_in_thread(file_hash, local_path)
+            self.hashes[local_path] = content_hash
+            while len(self.hashes) > self.max_documents * 4:
+                self.hashes.popitem(last=False)
+        return content_hash
+
+    async def get(self, file_name) -> InstructionRules:
+        # Pinned while it is hashed and compiled, so the blob cache does not evict it meanwhile
+        local_path = await BLOB_CACHE.aget_path(file_name, pin=True)
+        try:
+            return await self._get(local_path)
+        finally:
+            BLOB_CACHE.release(local_path)
+
+    async def _get(self, local_path) -> InstructionRules:
+        content_hash = await self._content_hash(local_path)
+
+        rules = self.rules.get(content_hash)
+        if rules is not None:
+            self.rules.move_to_end(content_hash)
+            self.counters["memory_hits"] += 1
+            return rules
+        if content_hash in self.compiling:
+            return await asyncio.shield(self.compiling[content_hash])
+
+        future = self.compiling[content_hash] = asyncio.get_running_loop().create_future()
+        try:
+            snippets = await run_in_thread(self._load, content_hash)
+            if snippets is not None:
+                self.counters["disk_hits"] += 1
+            else:
+                snippets = await run_in_process(compile_instructions, local_path)
+                await run_in_thread(self._store, content_hash, snippets)
+                self.counters["compiles"] += 1
+            rules = InstructionRules(content_hash, snippets)
+            self.rules[content_hash] = rules
+            while len(self.rules) > self.max_documents:
+                self.rules.popitem(last=False)
+            future.set_result(rules)
+            return rules
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the error; mark it retrieved in case there are none
+            future.exception()
+            raise
+        finally:
+            del self.compiling[content_hash]
+
+    def stats(self):
+        return {**self.counters, "documents": len(self.rules)}
+
+
+INSTRUCTION_RULES_STORE = InstructionRulesStore()
@@ -0,0 +1,133 @@
+import asyncio
+import os
+import time
+import uuid
+
+from utils.environment_variables import JOB_WORKERS, JOB_QUEUE_SIZE, JOB_OUTPUT_DIR, JOB_RETENTION
+from utils.metrics import METRICS
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, filename, session_id=None, instructions_filename=None):
+        self.id = uuid.uuid4().hex  # Also the document id of the job's anomalies
+        self.filename = filename
+        self.session_id = session_id
+        self.instructions_filename = instructions_filename
+        self.status = "queued"  # queued -> extracting -> extracted -> validating -> annotating -> annotated -> done | failed
+        self.fields_total = None
+        self.fields_validated = 0
+        self.fields_reused = 0  # Verdicts reused from the previous revision of the document
+        self.anomalies = None
+        self.knowledge_base = []
+        self.stage_timings = {}
+        self.error = None
+        self.output_path = os.path.join(JOB_OUTPUT_DIR, f"{self.id}.pdf")
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def update(self, stage, **counts):
+        # Called from worker threads while validating; plain attribute writes only
+        self.status = stage
+        for name, value in counts.items():
+            setattr(self, name, value)
+        self.updated_at = time.time()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "document_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "fields_total": self.fields_total,
+            "fields_validated": self.fields_validated,
+            "fields_reused": self.fields_reused,
+            "anomalies": self.anomalies,
+            "stage_timings": self.stage_timings,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobQueue:
+    """
+    Local document processing queue. Each worker task takes one job at a time and runs
+    the PDFProcessor stages for it; throughput scales with JOB_WORKERS.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_size=JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.max_size = max_size
+        self.jobs = {}
+        self.queue = None
+        self.tasks = []
+
+    async def start(self):
+        os.makedirs(JOB_OUTPUT_DIR, exist_ok=True)
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, filename, session_id=None, instructions_filename=None) -> Job:
+        self._prune()
+        job = Job(filename, session_id, instructions_filename)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError("Job queue is full, try again later")
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job):
+        from services.ml_services.summarizator import PDFProcessor
+
+        processor = PDFProcessor(job.filename, job.output_path, document_id=job.id, session_id=job.session_id,
+                                 instructions_path=job.instructions_filename)
+        try:
+            await processor.process_pdf_async(on_progress=job.update)
+            job.knowledge_base = processor.knowledge_base
+            job.update("done", anomalies=len(processor.anomalous_fields))
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job.update("failed", error=str(e))
+        finally:
+            job.stage_timings = processor.stage_timings
+
+    def _prune(self):
+        # Forget finished jobs (and their output files) once they are older than JOB_RETENTION
+        expired_before = time.time() - JOB_RETENTION
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and job.updated_at < expired_before:
+                del self.jobs[job_id]
+                if os.path.exists(job.output_path):
+                    os.remove(job.output_path)
+
+
+JOB_QUEUE = JobQueue()
+
+METRICS.gauge("jobs_queued", "Jobs waiting for a worker.",
+              function=lambda: JOB_QUEUE.queue.qsize() if JOB_QUEUE.queue is not None else 0)
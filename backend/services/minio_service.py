@@ -1,9 +1,13 @@
 from minio import Minio
 from minio.error import S3Error
+import asyncio
 import io
 import os
+import threading
 
-from utils.environment_variables import MINIO_URL, MINIO_USER, MINIO_PASSWORD
+from utils.environment_variables import MINIO_URL, MINIO_USER, MINIO_PASSWORD, MINIO_PART_SIZE
+from utils.metrics import MINIO_REQUEST_SECONDS, span
+from utils.worker_pool import run_in_thread
 
 # Configure MinIO client
 MINIO_CLIENT = Minio(
@@ -15,32 +19,140 @@ MINIO_CLIENT = Minio(
 
 BUCKET_NAME = "user"
 
-# Ensure the bucket exists
-found = MINIO_CLIENT.bucket_exists(BUCKET_NAME)
-if not found:
-    MINIO_CLIENT.make_bucket(BUCKET_NAME)
+bucket_lock = threading.Lock()
+bucket_ready = False
 
-async def upload_file_to_minio(file):
+
+def ensure_bucket():
+    """
+    Creates the bucket if it is missing. Runs once per process, at startup or before
+    the first upload, so importing this module makes no network call.
+    """
+    global bucket_ready
+    if bucket_ready:
+        return
+    with bucket_lock:
+        if not bucket_ready:
+            if not check_minio():
+                MINIO_CLIENT.make_bucket(BUCKET_NAME)
+            bucket_ready = True
+
+
+def check_minio():
+    # Readiness probe: one request to the server, without creating anything
+    with span(MINIO_REQUEST_SECONDS, operation="bucket_exists"):
+        return MINIO_CLIENT.bucket_exists(BUCKET_NAME)
+
+
+def put_file_to_minio(file_name, file_obj, length=-1):
+    # Streams file_obj in MINIO_PART_SIZE chunks (multipart above one part), so only
+    # one part is held in memory regardless of the file size
     try:
-        file_data = await file.read()
-        MINIO_CLIENT.put_object(
-            BUCKET_NAME,
-            file.filename,
-            data=io.BytesIO(file_data),
-            length=len(file_data),
-            content_type='application/pdf'
-        )
+        ensure_bucket()
+        with span(MINIO_REQUEST_SECONDS, operation="put_object"):
+            MINIO_CLIENT.put_object(
+                BUCKET_NAME,
+                file_name,
+                data=file_obj,
+                length=length,
+                part_size=MINIO_PART_SIZE,
+                content_type='application/pdf'
+            )
     except S3Error as err:
-        raise Exception(f"Failed to upload {file.filename}: {str(err)}")
+        raise Exception(f"Failed to upload {file_name}: {str(err)}")
+
+
+async def upload_file_to_minio(file):
+    # Upload straight from the UploadFile spool, off the event loop
+    await file.seek(0)
+    length = file.size if file.size is not None else -1
+    await run_in_thread(put_file_to_minio, file.filename, file.file, length)
+
+
+async def upload_files_to_minio(files):
+    """
+    Uploads several UploadFiles in parallel. Returns one entry per file: None on
+    success or the exception raised for that file.
+    """
+    results = await asyncio.gather(*(upload_file_to_minio(file) for file in files), return_exceptions=True)
+    return [result if isinstance(result, Exception) else None for result in results]
+
+
+def annotated_object_name(document_id):
+    return f"annotated/{document_id}.pdf"
+
+
+def upload_annotated_pdf(document_id, data=None, path=None):
+    # Stores an annotated PDF from its buffer (or spool file); returns whether it worked
+    try:
+        if path is not None:
+            with open(path, "rb") as f:
+                put_file_to_minio(annotated_object_name(document_id), f, os.path.getsize(path))
+        else:
+            put_file_to_minio(annotated_object_name(document_id), io.BytesIO(data), len(data))
+        return True
+    except Exception as e:
+        print(f"Failed to store the annotated PDF of document '{document_id}': {e}")
+        return False
 
 
 # Get file from MinIO
 def get_file_from_minio(file_name):
     try:
-        response = MINIO_CLIENT.get_object(BUCKET_NAME, file_name)
-        file_data = response.read()
-        response.close()
-        response.release_conn()
+        with span(MINIO_REQUEST_SECONDS, operation="get_object"):
+            response = MINIO_CLIENT.get_object(BUCKET_NAME, file_name)
+            file_data = response.read()
+            response.close()
+            response.release_conn()
         return file_data
     except S3Error as err:
-        raise Exception(f"Failed to download {file_name}: {str(err)}")
\ No newline at end of file
+        raise Exception(f"Failed to download {file_name}: {str(err)}")
+
+
+# Download file from MinIO straight to a local path without buffering it in memory
+def download_file_from_minio(file_name, file_path):
+    try:
+        with span(MINIO_REQUEST_SECONDS, operation="fget_object"):
+            MINIO_CLIENT.fget_object(BUCKET_NAME, file_name, file_path)
+    except S3Error as err:
+        raise Exception(f"Failed to download {file_name}: {str(err)}")
+
+
+# Metadata (size, ETag) of a file in MinIO
+def stat_file_in_minio(file_name):
+    try:
+        with span(MINIO_REQUEST_SECONDS, operation="stat_object"):
+            return MINIO_CLIENT.stat_object(BUCKET_NAME, file_name)
+    except S3Error as err:
+        raise Exception(f"Failed to stat {file_name}: {str(err)}")
+
+
+def stream_file_from_minio(file_name, offset=0, length=0, chunk_size=1024 * 1024):
+    """
+    Yields the object (or the byte range offset..offset+length) in chunks instead of
+    reading it whole. length=0 reads to the end of the object.
+    """
+    try:
+        # Times until the response headers; the body is streamed by the caller
+        with span(MINIO_REQUEST_SECONDS, operation="get_object_stream"):
+            response = MINIO_CLIENT.get_object(BUCKET_NAME, file_name, offset=offset, length=length)
+    except S3Error as err:
+        raise Exception(f"Failed to download {file_name}: {str(err)}")
+    try:
+        yield from response.stream(chunk_size)
+    finally:
+        response.close()
+        response.release_conn()
+
+
+# Ranged read of a single part of a file
+def get_file_range_from_minio(file_name, offset, length):
+    return b"".join(stream_file_from_minio(file_name, offset=offset, length=length))
+
+
+async def aget_file_from_minio(file_name):
+    return await run_in_thread(get_file_from_minio, file_name)
+
+
+async def adownload_file_from_minio(file_name, file_path):
+    await run_in_thread(download_file_from_minio, file_name, file_path)
\ No newline at end of file
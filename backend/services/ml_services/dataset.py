@@ -1,84 +1,128 @@
 import os
-from pdfrw import PdfReader
-import pdfplumber
-from pdf2image import convert_from_path
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import fitz
 import pytesseract
+from PIL import Image
+
+from services.ml_services.extraction import DocumentExtraction, extract_document
+from services.ml_services.spatial_index import match_fields_on_pages
+
 
+def as_extraction(source):
+    # Accept a path or an extraction that was already made, so a document is parsed once
+    return source if isinstance(source, DocumentExtraction) else extract_document(source)
 
-# Function 1: Extract empty fields and their coordinates (AcroForm structure)
-def extract_empty_fields_with_pdfrw(pdf_path):
-    empty_fields = []
-    pdf = PdfReader(pdf_path)
-    if not pdf.Root.AcroForm or not pdf.Root.AcroForm.Fields:
-        print("No AcroForm fields found.")
-        return empty_fields
-
-    fields = pdf.Root.AcroForm.Fields
-    for field in fields:
-        field_name = field.T if isinstance(field.T, str) else field.T.decode('utf-8', errors='ignore') if field.T else "Unnamed Field"
-        field_value = field.V
-        field_rect = field.Rect  # Coordinates [LLx, LLy, URx, URy]
-        if not field_value:  # Check if the field is empty
-            empty_fields.append({
-                "name": field_name,
-                "rect": list(map(float, field_rect))
-            })
+
+# Function 1: Extract empty fields and their coordinates (AcroForm widgets)
+def extract_empty_fields(source):
+    empty_fields = as_extraction(source).empty_fields()
+    if not empty_fields:
+        print("No empty form fields found.")
     return empty_fields
 
 
-# Function 2: Extract text near empty fields using pdfplumber
-def extract_text_near_fields(pdf_path, empty_fields, margin=20):
-    nearby_text = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages):
-            words = page.extract_words()  # Extract words with coordinates
-            for field in empty_fields:
-                field_rect = field["rect"]
-                for word in words:
-                    x0, y0, x1, y1 = word['x0'], word['top'], word['x1'], word['bottom']
-                    # Check if the word is within the margin of the field
-                    if (
-                            x0 >= field_rect[0] - margin and x1 <= field_rect[2] + margin and
-                            y0 >= field_rect[1] - margin and y1 <= field_rect[3] + margin
-                    ):
-                        nearby_text.append({
-                            "field": field["name"],
-                            "page": page_num + 1,
-                            "text": word['text']
-                        })
-    return nearby_text
+# Function 2: Extract text near empty fields from the PDF text layer
+def extract_text_near_fields(source, empty_fields, margin=20):
+    # Each field is checked only against the words of its page, through a grid index
+    return match_fields_on_pages(as_extraction(source).pages, empty_fields, margin)
 
 
-# Function 3: Use OCR to extract nearby text for scanned PDFs
-def extract_text_near_fields_with_ocr(pdf_path, empty_fields, margin=20, dpi=300):
-    nearby_text = []
-    pages = convert_from_path(pdf_path, dpi=dpi)
-    for page_num, page_image in enumerate(pages):
-        # Extract text with bounding boxes using OCR
-        data = pytesseract.image_to_data(page_image, lang='eng', output_type=pytesseract.Output.DICT)
-        for field in empty_fields:
-            field_rect = field["rect"]
+def merge_regions(regions):
+    # Union of overlapping rectangles, so no word is OCRed twice
+    merged = []
+    for region in regions:
+        region = list(region)
+        overlapping = True
+        while overlapping:
+            overlapping = False
+            for other in merged:
+                if region[0] <= other[2] and other[0] <= region[2] and region[1] <= other[3] and other[1] <= region[3]:
+                    merged.remove(other)
+                    region = [min(region[0], other[0]), min(region[1], other[1]),
+                              max(region[2], other[2]), max(region[3], other[3])]
+                    overlapping = True
+                    break
+        merged.append(region)
+    return merged
+
+
+def field_regions(fields, margin, padding):
+    # Words can only match a field inside its rect grown by margin; the extra padding
+    # keeps words cut by the crop edge outside that area
+    grow = margin + padding
+    return merge_regions([
+        (field["rect"][0] - grow, field["rect"][1] - grow, field["rect"][2] + grow, field["rect"][3] + grow)
+        for field in fields
+    ])
+
+
+def ocr_page(pdf_path, page_num, dpi, regions=None):
+    """
+    Renders one page (or only the given regions of it) and OCRs it. Runs in a worker
+    process; returns the (texts, x0, y0, x1, y1) word columns in page coordinates.
+    """
+    scale = 72 / dpi  # Pixels back to points
+    columns = ([], [], [], [], [])
+    with fitz.open(pdf_path) as pdf_document:
+        page = pdf_document[page_num]
+        for region in regions or [page.rect]:
+            clip = fitz.Rect(region) & page.rect
+            if clip.is_empty:
+                continue
+            pixmap = page.get_pixmap(dpi=dpi, clip=clip)
+            image = Image.frombytes("RGB" if pixmap.n < 4 else "RGBA", (pixmap.width, pixmap.height), pixmap.samples)
+            # Extract text with bounding boxes using OCR
+            data = pytesseract.image_to_data(image, lang='eng', output_type=pytesseract.Output.DICT)
             for i, word in enumerate(data['text']):
                 if word.strip():
-                    x, y, w, h = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
-                    # Check if word is near the field's coordinates
-                    if (
-                            x >= field_rect[0] - margin and (x + w) <= field_rect[2] + margin and
-                            y >= field_rect[1] - margin and (y + h) <= field_rect[3] + margin
-                    ):
-                        nearby_text.append({
-                            "field": field["name"],
-                            "page": page_num + 1,
-                            "text": word
-                        })
-    return nearby_text
+                    columns[0].append(word)
+                    columns[1].append(clip.x0 + data['left'][i] * scale)
+                    columns[2].append(clip.y0 + data['top'][i] * scale)
+                    columns[3].append(clip.x0 + (data['left'][i] + data['width'][i]) * scale)
+                    columns[4].append(clip.y0 + (data['top'][i] + data['height'][i]) * scale)
+    return columns
+
+
+# Function 3: Use OCR to extract nearby text for scanned PDFs
+def extract_text_near_fields_with_ocr(pdf_path, empty_fields, margin=20, dpi=300, workers=None, crop=True,
+                                      padding=20):
+    """
+    Pages are rendered one at a time inside worker processes and only pages holding
+    empty fields are OCRed (every page if a field's page is unknown). With crop=True
+    only the areas around the field rects are rendered and passed to Tesseract.
+    Memory stays at about one rendered page per worker whatever the page count.
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        page_count = len(pdf_document)
+
+    if any(field.get("page") is None for field in empty_fields):
+        fields_by_page = {page_num: empty_fields for page_num in range(page_count)}
+    else:
+        fields_by_page = {}
+        for field in empty_fields:
+            fields_by_page.setdefault(field["page"], []).append(field)
+
+    page_nums = sorted(fields_by_page)
+    regions = [field_regions(fields_by_page[page_num], margin, padding) if crop else None for page_num in page_nums]
+
+    pages = [([], [], [], [], []) for _ in range(page_count)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(ocr_page, repeat(pdf_path), page_nums, repeat(dpi), regions)
+        for page_num, columns in zip(page_nums, results):
+            pages[page_num] = columns
+    return match_fields_on_pages(pages, empty_fields, margin)
 
 
 # Main function to process the PDF
 def process_pdf(pdf_path):
+    # Parse the document once for widgets and words
+    extraction = extract_document(pdf_path)
+
     # Extract empty fields
     print("Extracting empty fields...")
-    empty_fields = extract_empty_fields_with_pdfrw(pdf_path)
+    empty_fields = extract_empty_fields(extraction)
     if not empty_fields:
         print("No empty fields found.")
         return
@@ -87,9 +131,9 @@ def process_pdf(pdf_path):
     for field in empty_fields:
         print(f" - {field['name']} at {field['rect']}")
 
-    # Extract text near empty fields using pdfplumber
+    # Extract text near empty fields from the text layer
     print("\nExtracting text near empty fields (structured)...")
-    text_near_fields = extract_text_near_fields(pdf_path, empty_fields)
+    text_near_fields = extract_text_near_fields(extraction, empty_fields)
     for item in text_near_fields:
         print(f"Field '{item['field']}' (Page {item['page']}): {item['text']}")
 
@@ -0,0 +1,80 @@
+# Single-pass PyMuPDF extraction shared by the validation pipeline (PDFProcessor)
+# and the proximity/OCR helpers in dataset.py. Widget rects and word boxes are both
+# in PyMuPDF page coordinates (points, origin at the top-left corner).
+from typing import NamedTuple
+
+import fitz
+import numpy as np
+
+
+class Widget(NamedTuple):
+    field_name: str
+    field_value: str
+    page_number: int  # 0-based
+    rect: tuple  # (x0, y0, x1, y1)
+    field_type: str  # "Text", "CheckBox", "RadioButton", ...
+
+
+class PageWords(NamedTuple):
+    # Columnar word boxes of one page, in reading order
+    texts: list
+    x0: np.ndarray
+    y0: np.ndarray
+    x1: np.ndarray
+    y1: np.ndarray
+
+
+class DocumentExtraction:
+    def __init__(self, widgets, pages, page_sizes):
+        self.widgets = widgets  # Every widget, filled and empty, in page order
+        self.pages = pages  # PageWords per page; None when words were not extracted
+        self.page_sizes = page_sizes  # (width, height) per page
+
+    def empty_fields(self):
+        """
+        Empty widgets in the {"name", "rect", "page"} form used by the dataset helpers.
+        """
+        return [
+            {"name": widget.field_name or "Unnamed Field", "rect": list(widget.rect), "page": widget.page_number}
+            for widget in self.widgets
+            if widget.field_value in (None, "")
+        ]
+
+
+EMPTY_COLUMN = np.empty(0, dtype=np.float32)
+
+
+def page_words(page):
+    words = page.get_text("words")  # (x0, y0, x1, y1, text, block, line, word)
+    if not words:
+        return PageWords([], EMPTY_COLUMN, EMPTY_COLUMN, EMPTY_COLUMN, EMPTY_COLUMN)
+    boxes = np.array([word[:4] for word in words], dtype=np.float32)
+    return PageWords([word[4] for word in words], boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3])
+
+
+def extract_document(source, words=True):
+    """
+    Reads widgets and (optionally) words of every page in one pass.
+    source is a path or an already open fitz document (which is left open).
+    """
+    pdf_document = source if isinstance(source, fitz.Document) else fitz.open(source)
+    try:
+        widgets, pages, page_sizes = [], [] if words else None, []
+        for page_number in range(len(pdf_document)):
+            page = pdf_document[page_number]
+            page_sizes.append((page.rect.width, page.rect.height))
+            for widget in page.widgets() or []:
+                rect = widget.rect
+                widgets.append(Widget(
+                    widget.field_name,
+                    widget.field_value,
+                    page_number,
+                    (rect.x0, rect.y0, rect.x1, rect.y1),
+                    widget.field_type_string,
+                ))
+            if words:
+                pages.append(page_words(page))
+        return DocumentExtraction(widgets, pages, page_sizes)
+    finally:
+        if pdf_document is not source:
+            pdf_document.close()
@@ -0,0 +1,135 @@
+import re
+import threading
+from datetime import date
+
+from services.ml_services.validation_cache import normalize_field_name
+
+# Widget types whose value is always one of the predefined choices
+CHOICE_FIELD_TYPES = {"CheckBox", "RadioButton", "ComboBox", "ListBox"}
+
+DATE_PATTERN = re.compile(r"^(\d{1,2})[./\-\s](\d{1,2})[./\-\s](\d{4})$|^(\d{4})[./\-](\d{1,2})[./\-](\d{1,2})$")
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[A-Za-z]{2,}$")
+PHONE_PATTERN = re.compile(r"^\+?[\d\s\-()/.]+$")
+POSTCODE_PATTERN = re.compile(r"^(?=.*\d)[A-Za-z0-9\- ]{3,10}$")
+
+
+def calendar_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def check_date(field_name, value):
+    match = DATE_PATTERN.match(value)
+    if not match:
+        # Only a value without any digit is clearly not a date; other formats go to the model
+        return None if re.search(r"\d", value) else "Invalid: The value is not a date."
+    if match.group(1):
+        first, second, year = int(match.group(1)), int(match.group(2)), int(match.group(3))
+        # Day/month or month/day is up to the form, so only a value that is a calendar date
+        # in neither order is rejected; the model, which sees the instructions, decides the rest
+        readings = [parsed for parsed in (calendar_date(year, second, first), calendar_date(year, first, second))
+                    if parsed is not None]
+        if not readings:
+            return "Invalid: The value is not an existing calendar date."
+        if "birth" in field_name and min(readings) > date.today():
+            return "Invalid: The date of birth is in the future."
+        return None
+    parsed = calendar_date(int(match.group(4)), int(match.group(5)), int(match.group(6)))
+    if parsed is None:
+        return "Invalid: The value is not an existing calendar date."
+    if "birth" in field_name and parsed > date.today():
+        return "Invalid: The date of birth is in the future."
+    return "Valid"
+
+
+def check_email(field_name, value):
+    if EMAIL_PATTERN.match(value):
+        return "Valid"
+    return "Invalid: The value is not an email address." if "@" not in value else None
+
+
+def check_phone(field_name, value):
+    digits = sum(character.isdigit() for character in value)
+    if PHONE_PATTERN.match(value) and 6 <= digits <= 15:
+        return "Valid"
+    return "Invalid: The value is not a phone number." if digits == 0 else None
+
+
+def check_postcode(field_name, value):
+    return "Valid" if POSTCODE_PATTERN.match(value) else None
+
+
+# (field name pattern, check); the first pattern matching the normalized field name wins.
+# A check returns 'Valid', 'Invalid: [Reason]', or None when the model has to decide.
+RULES = [
+    ("date", re.compile(r"\b(date|datum|dob|born|birthday)\b"), check_date),
+    ("email", re.compile(r"\be-?mail\b"), check_email),
+    ("phone", re.compile(r"\b(phone|telephone|tel|mobile|telefon|telefónne číslo)\b"), check_phone),
+    ("postcode", re.compile(r"\b(post ?code|postal code|zip( code)?|psč)\b"), check_postcode),
+]
+
+
+class RuleStats:
+    """
+    How many fields the rules resolved without the LLM, and an estimate of the time
+    that saved based on the measured LLM latency per field.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fields_checked = 0
+        self.resolved_by_rule = {}
+        self.llm_fields = 0
+        self.llm_seconds = 0.0
+
+    def record_rule(self, rule_name):
+        with self.lock:
+            self.fields_checked += 1
+            if rule_name is not None:
+                self.resolved_by_rule[rule_name] = self.resolved_by_rule.get(rule_name, 0) + 1
+
+    def record_llm(self, fields, seconds):
+        with self.lock:
+            self.llm_fields += fields
+            self.llm_seconds += seconds
+
+    def stats(self):
+        with self.lock:
+            resolved = sum(self.resolved_by_rule.values())
+            llm_seconds_per_field = self.llm_seconds / self.llm_fields if self.llm_fields else 0.0
+            return {
+                "fields_checked": self.fields_checked,
+                "resolved_locally": resolved,
+                "resolved_locally_fraction": resolved / self.fields_checked if self.fields_checked else 0.0,
+                "resolved_by_rule": dict(self.resolved_by_rule),
+                "llm_fields": self.llm_fields,
+                "llm_seconds_per_field": llm_seconds_per_field,
+                "estimated_seconds_saved": resolved * llm_seconds_per_field,
+            }
+
+
+RULE_STATS = RuleStats()
+
+
+def check_field(field):
+    """
+    Local verdict for a field, or None if the LLM has to validate it.
+    """
+    if field.field_type in CHOICE_FIELD_TYPES:
+        RULE_STATS.record_rule("choice")
+        return "Valid"
+    if not field.field_value:
+        RULE_STATS.record_rule("empty")
+        return "Invalid: The field is empty."
+
+    field_name = normalize_field_name(field.field_name)
+    for rule_name, pattern, check in RULES:
+        if pattern.search(field_name):
+            verdict = check(field_name, field.field_value)
+            RULE_STATS.record_rule(rule_name if verdict is not None else None)
+            return verdict
+
+    RULE_STATS.record_rule(None)
+    return None
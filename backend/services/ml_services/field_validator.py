@@ -0,0 +1,306 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from services.ml_services.field_rules import check_field, RULE_STATS
+from services.ml_services.validation_cache import get_verdict_cache, make_cache_key
+from utils.environment_variables import (
+    VALIDATION_CONCURRENCY,
+    VALIDATION_BATCH_SIZE,
+    VALIDATION_RULES_ENABLED,
+    LLM_BACKEND,
+    LLM_BASE_URL,
+    LLM_MODEL,
+)
+from utils.metrics import FIELDS_VALIDATED, LLM_CALL_SECONDS, span
+
+VALIDATION_MODEL = LLM_MODEL
+
+FIELD_PROMPT = """
+    You are an expert data validator. Given the field name and its value, determine if the value is appropriate for the field.
+
+    Respond in the following format:
+    - If the value is appropriate, respond with 'Valid'.
+    - If the value is not appropriate, respond with 'Invalid: [Reason]', where [Reason] is a brief explanation.
+
+    Field Name: {field_name}
+    Field Value: {field_value}
+
+    Is the field value appropriate for the field name?
+    """
+
+INSTRUCTIONS_SECTION = """
+    The form's instructions say about this field:
+    {instructions}
+
+    Judge the value against these instructions as well.
+    """
+
+BATCH_PROMPT = """
+    You are an expert data validator. For every field in the list below, determine if the value is appropriate for the field name.
+    A field may carry "instructions" from the form's guide; judge its value against them as well.
+
+    Respond with a JSON object that maps each field id (as a string) to its verdict:
+    - If the value is appropriate, the verdict is 'Valid'.
+    - If the value is not appropriate, the verdict is 'Invalid: [Reason]', where [Reason] is a brief explanation.
+
+    Fields:
+    {fields}
+    """
+
+# Cached verdicts are only reused while the prompts, model and backend stay the same
+# (stub verdicts must never be served to a real run)
+PROMPT_VERSION = hashlib.sha256(
+    (LLM_BACKEND + (LLM_BASE_URL or "") + VALIDATION_MODEL + FIELD_PROMPT + INSTRUCTIONS_SECTION + BATCH_PROMPT)
+    .encode("utf-8")
+).hexdigest()[:16]
+
+
+def field_cache_key(field):
+    # A verdict given under the form's instructions only holds for the same instructions
+    instructions = getattr(field, "instructions", None)
+    version = PROMPT_VERSION
+    if instructions:
+        version += hashlib.sha256(instructions.encode("utf-8")).hexdigest()[:16]
+    return make_cache_key(field.field_name, field.field_value, version)
+
+
+class ValidationResult:
+    def __init__(self, text=None, error=None):
+        self.text = text  # Raw 'Valid' / 'Invalid: [Reason]' verdict
+        self.error = error  # Exception raised while validating, if any
+
+
+def is_definite(result):
+    # Errors and unparseable answers are not stored anywhere, so they are retried on the next run
+    if result is None or result.error is not None or not result.text:
+        return False
+    return result.text.lower().startswith(('valid', 'invalid'))
+
+
+class FieldValidator:
+    """
+    Validates form fields against the LLM with a bounded number of concurrent requests.
+
+    With batch_size > 1 several fields are packed into a single JSON prompt and the
+    response is split back per field; fields missing from a batch answer are retried
+    one by one. Results are always returned in the order of the input fields.
+
+    Fields the local rules can decide (empty values, choice widgets, well-formed dates,
+    emails, ...) and verdicts already present in the verdict cache are resolved
+    without an API call.
+    """
+
+    def __init__(self, client, concurrency=VALIDATION_CONCURRENCY, batch_size=VALIDATION_BATCH_SIZE,
+                 cache=None, use_rules=VALIDATION_RULES_ENABLED):
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.cache = cache if cache is not None else get_verdict_cache()
+        self.use_rules = use_rules
+
+    def validate(self, fields, on_progress=None, known=None):
+        """
+        on_progress, if given, is called with the number of fields validated so far.
+        known, if given, holds a verdict (or None) per field that is used as is, e.g.
+        from the previous revision of the same document.
+        """
+        results = [None] * len(fields)
+        keys = [field_cache_key(field) for field in fields]
+
+        pending = []
+        sources = {"revision": 0, "rules": 0, "cache": 0}
+        for index, key in enumerate(keys):
+            verdict, source = (known[index] if known is not None else None), "revision"
+            # The local rules know nothing of the form's instructions (optional fields, required
+            # formats), so a field that has instructions is left to the cache and the model
+            if verdict is None and self.use_rules and not getattr(fields[index], "instructions", None):
+                verdict, source = check_field(fields[index]), "rules"
+            if verdict is None and self.cache is not None:
+                verdict, source = self.cache.get(key), "cache"
+            if verdict is not None:
+                results[index] = ValidationResult(text=verdict)
+                sources[source] += 1
+            else:
+                pending.append(index)
+        sources["llm"] = len(pending)
+        for source, count in sources.items():
+            if count:
+                FIELDS_VALIDATED.inc(count, source=source)
+
+        if on_progress is not None:
+            on_progress(len(fields) - len(pending))
+
+        if pending:
+            self._validate_pending(fields, pending, results, on_progress)
+
+        if self.cache is not None:
+            self.cache.put_many([
+                (keys[index], results[index].text)
+                for index in pending
+                if is_definite(results[index])
+            ])
+
+        return results
+
+    def _validate_pending(self, fields, pending, results, on_progress=None):
+        batches = [pending[start:start + self.batch_size] for start in range(0, len(pending), self.batch_size)]
+        done = len(fields) - len(pending)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(self._validate_batch, [fields[i] for i in batch]): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                for index, result in zip(batch, future.result()):
+                    results[index] = result
+                done += len(batch)
+                if on_progress is not None:
+                    on_progress(done)
+
+    def _validate_batch(self, fields):
+        if len(fields) == 1:
+            return [self._validate_single(fields[0])]
+
+        try:
+            verdicts = self._request_batch(fields)
+        except Exception as e:
+            print(f"Batch validation failed, falling back to single requests: {e}")
+            verdicts = {}
+
+        results = []
+        for field_id, field in enumerate(fields, start=1):
+            verdict = verdicts.get(str(field_id))
+            if isinstance(verdict, str) and verdict.strip():
+                results.append(ValidationResult(text=verdict.strip()))
+            else:
+                results.append(self._validate_single(field))
+        return results
+
+    def _validate_single(self, field):
+        prompt = FIELD_PROMPT.format(field_name=field.field_name, field_value=field.field_value)
+        if getattr(field, "instructions", None):
+            prompt += INSTRUCTIONS_SECTION.format(instructions=field.instructions)
+        try:
+            start = time.perf_counter()
+            with span(LLM_CALL_SECONDS, operation="validate_field"):
+                response = self.client.chat_completion(
+                    model=VALIDATION_MODEL,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=50,
+                    temperature=0,
+                )
+            RULE_STATS.record_llm(1, time.perf_counter() - start)
+            return ValidationResult(text=response.choices[0].message.content.strip())
+        except Exception as e:
+            return ValidationResult(error=e)
+
+    def _request_batch(self, fields):
+        items = []
+        for field_id, field in enumerate(fields, start=1):
+            item = {"id": str(field_id), "field_name": field.field_name, "field_value": field.field_value}
+            if getattr(field, "instructions", None):
+                item["instructions"] = field.instructions
+            items.append(item)
+        payload = json.dumps(items, ensure_ascii=False, indent=2)
+
+        start = time.perf_counter()
+        with span(LLM_CALL_SECONDS, operation="validate_batch"):
+            response = self.client.chat_completion(
+                model=VALIDATION_MODEL,
+                messages=[{"role": "user", "content": BATCH_PROMPT.format(fields=payload)}],
+                max_tokens=50 * len(fields),
+                temperature=0,
+                response_format={"type": "json_object"},
+            )
+        RULE_STATS.record_llm(len(fields), time.perf_counter() - start)
+        verdicts = json.loads(response.choices[0].message.content)
+        if not isinstance(verdicts, dict):
+            raise ValueError("Batch response is not a JSON object")
+        return verdicts
+
+
+class SharedFieldValidator:
+    """
+    Validator shared by the documents of one batch: a (field, value) pair, under the
+    same instructions, is validated once and its verdict handed to every document
+    that has it. Thread-safe; each document calls validate() from its own thread.
+
+    A document validates the pairs it sees first through the wrapped FieldValidator
+    (rules, verdict cache, batched LLM requests) and then waits for the pairs other
+    documents claimed first. Owners resolve their pairs before waiting on anyone
+    else's, so two documents can never wait on each other. Only definite verdicts are
+    shared: when an owner's validation fails, the pair is released and every document
+    waiting on it validates it again itself.
+    """
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.lock = threading.Lock()
+        self.verdicts = {}  # field cache key -> Future of its ValidationResult
+        self.requested = 0
+        self.shared = 0
+
+    def validate(self, fields, on_progress=None, known=None):
+        results = [None] * len(fields)
+        owned, waiting = [], []
+        reused = 0
+        with self.lock:
+            for index, field in enumerate(fields):
+                if known is not None and known[index] is not None:
+                    results[index] = ValidationResult(text=known[index])
+                    reused += 1
+                    continue
+                key = field_cache_key(field)
+                future = self.verdicts.get(key)
+                if future is None:
+                    future = self.verdicts[key] = Future()
+                    owned.append((index, future))
+                else:
+                    waiting.append((index, future))
+            self.requested += len(owned) + len(waiting)
+            self.shared += len(waiting)
+        if reused:
+            FIELDS_VALIDATED.inc(reused, source="revision")
+        if waiting:
+            FIELDS_VALIDATED.inc(len(waiting), source="batch")
+
+        if owned:
+            try:
+                owned_results = self.validator.validate([fields[index] for index, _ in owned])
+            except Exception as e:
+                owned_results = [ValidationResult(error=e)] * len(owned)
+            for (index, future), result in zip(owned, owned_results):
+                results[index] = result
+                if not is_definite(result):
+                    # Not shared: the next document with this pair claims it again
+                    with self.lock:
+                        if self.verdicts.get(field_cache_key(fields[index])) is future:
+                            del self.verdicts[field_cache_key(fields[index])]
+                    result = None
+                future.set_result(result)
+
+        retry = []
+        for index, future in waiting:
+            results[index] = future.result()
+            if results[index] is None:
+                retry.append(index)
+        if retry:
+            try:
+                retried = self.validator.validate([fields[index] for index in retry])
+            except Exception as e:
+                retried = [ValidationResult(error=e)] * len(retry)
+            for index, result in zip(retry, retried):
+                results[index] = result
+
+        if on_progress is not None:
+            on_progress(len(fields))
+        return results
+
+    def stats(self):
+        with self.lock:
+            return {"fields": self.requested, "unique_fields": len(self.verdicts), "fields_shared": self.shared}
@@ -0,0 +1,127 @@
+import re
+
+from services.ml_services.retrieval import KnowledgeBaseIndex, tokenize
+from utils.environment_variables import INSTRUCTION_RULES_TOP_K, INSTRUCTION_RULES_MAX_CHARS
+
+# Bump when the snippet or constraint format changes, so compiled indexes are rebuilt
+COMPILER_VERSION = "1"
+
+MAX_SNIPPET_CHARS = 500
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?;])\s+")
+
+# Words that say nothing about which field a rule is for
+STOPWORDS = {
+    "a", "an", "and", "at", "by", "for", "in", "is", "of", "on", "or", "the", "to", "your",
+    "field", "fill", "enter", "please", "here", "box",
+}
+
+# (constraint name, pattern, value of the match)
+CONSTRAINT_PATTERNS = [
+    ("max_length", re.compile(r"\b(?:max(?:imum)?|at most|up to|no more than)\s+(\d+)\s+(?:characters|chars|letters|digits|signs)\b", re.I),
+     lambda match: int(match.group(1))),
+    ("digits", re.compile(r"\b(\d+)[- ]digits?\b", re.I),
+     lambda match: int(match.group(1))),
+    ("format", re.compile(r"\b((?:DD|MM|YYYY|YY)(?:[./\- ](?:DD|MM|YYYY|YY)){2})\b"),
+     lambda match: match.group(1)),
+    ("required", re.compile(r"\b(required|mandatory|must be (?:filled|completed|provided))\b", re.I),
+     lambda match: True),
+    ("optional", re.compile(r"\b(optional|if applicable|may be left (?:blank|empty))\b", re.I),
+     lambda match: True),
+    ("uppercase", re.compile(r"\b(block|capital) letters\b", re.I),
+     lambda match: True),
+]
+
+
+def split_snippets(text, max_chars=MAX_SNIPPET_CHARS):
+    # A text block becomes one snippet, or several of whole sentences when it is long
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return [text] if text else []
+    snippets, current = [], ""
+    for sentence in SENTENCE_PATTERN.split(text):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            snippets.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        snippets.append(current)
+    return snippets
+
+
+def extract_constraints(text):
+    constraints = {}
+    for name, pattern, value in CONSTRAINT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            constraints[name] = value(match)
+    return constraints
+
+
+def compile_snippets(page_blocks):
+    """
+    page_blocks: list of (page_number, block text). Returns the compiled snippets as
+    plain dicts, so they can cross the process pool and be stored as JSON.
+    """
+    snippets = []
+    for page_number, block in page_blocks:
+        for text in split_snippets(block):
+            snippets.append({
+                "id": len(snippets),
+                "page": page_number + 1,
+                "text": text,
+                "constraints": extract_constraints(text),
+            })
+    return snippets
+
+
+def describe_constraints(constraints):
+    parts = []
+    if constraints.get("required"):
+        parts.append("required")
+    if constraints.get("optional"):
+        parts.append("optional")
+    if "max_length" in constraints:
+        parts.append(f"at most {constraints['max_length']} characters")
+    if "digits" in constraints:
+        parts.append(f"{constraints['digits']} digits")
+    if "format" in constraints:
+        parts.append(f"format {constraints['format']}")
+    if constraints.get("uppercase"):
+        parts.append("capital letters")
+    return ", ".join(parts)
+
+
+class InstructionRules:
+    """
+    Compiled instruction document: a BM25 index over its snippets, queried by field
+    name for the requirements that apply to a field.
+    """
+
+    def __init__(self, content_hash, snippets):
+        self.content_hash = content_hash
+        self.snippets = snippets
+        self.index = KnowledgeBaseIndex(text_of=lambda snippet: snippet["text"], key_of=lambda snippet: snippet["id"])
+        self.index.sync(snippets)
+        self.memo = {}  # field name -> rules text; forms repeat field names a lot
+
+    def __len__(self):
+        return len(self.snippets)
+
+    def rules_for(self, field_name, k=INSTRUCTION_RULES_TOP_K, max_chars=INSTRUCTION_RULES_MAX_CHARS):
+        """
+        The snippets (with their extracted constraints) most relevant to the field, as
+        prompt text, or None if the instructions say nothing about it.
+        """
+        if field_name in self.memo:
+            return self.memo[field_name]
+
+        terms = [term for term in tokenize(field_name) if term not in STOPWORDS and not term.isdigit()]
+        rules = None
+        if terms:
+            lines = []
+            for snippet in self.index.search(" ".join(terms), k, fill=False):
+                constraints = describe_constraints(snippet["constraints"])
+                lines.append(f"- {snippet['text']}" + (f" ({constraints})" if constraints else ""))
+            rules = "\n".join(lines)[:max_chars] or None
+        self.memo[field_name] = rules
+        return rules
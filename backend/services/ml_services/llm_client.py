@@ -0,0 +1,317 @@
+import hashlib
+import json
+from abc import ABC, abstractmethod
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import httpx
+import openai
+from openai import OpenAI, DefaultHttpxClient
+
+from utils.environment_variables import (
+    OPEN_API_KEY,
+    LLM_BACKEND,
+    LLM_BASE_URL,
+    LLM_MAX_CONNECTIONS,
+    LLM_TIMEOUT,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+)
+from utils.metrics import LLM_EVENTS, LLM_TOKENS
+
+# Errors worth retrying: 429, 5xx, timeouts and dropped connections
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+DEFAULT_MAX_TOKENS = 256
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at per_minute / 60 tokens per second.
+    The balance may go negative after pause(), which makes every caller wait.
+    """
+
+    def __init__(self, per_minute):
+        self.lock = threading.Lock()
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """
+        Blocks until `amount` tokens are available and takes them. Returns the seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                amount = min(amount, self.capacity)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def set_limit(self, per_minute):
+        # Follow the limit the provider reports for this key
+        with self.lock:
+            self._refill()
+            if per_minute > 0 and per_minute != self.capacity:
+                self.capacity = float(per_minute)
+                self.rate = per_minute / 60.0
+                self.tokens = min(self.tokens, self.capacity)
+
+    def set_remaining(self, remaining):
+        # The provider's count is authoritative when it is lower than ours
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+
+    def pause(self, seconds):
+        # Empty the bucket for `seconds`, so all callers back off together
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+def request_key(request):
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(request):
+    # Rough prompt size (about 4 characters per token) plus the completion budget
+    prompt_chars = sum(len(str(message.get("content") or "")) for message in request.get("messages", []))
+    return prompt_chars // 4 + (request.get("max_tokens") or DEFAULT_MAX_TOKENS)
+
+
+def record_usage(response):
+    # Token counts the server reported for a (non-streaming) completion
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
+
+
+def retry_after(error):
+    # Seconds the provider asked us to wait, if it said so
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def header_int(headers, name):
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class LLMBackend(ABC):
+    """
+    What PDFProcessor/FieldValidator and ChatProcessor need from an LLM. Requests take
+    the keyword arguments of chat.completions.create and return the SDK's types.
+    """
+
+    @abstractmethod
+    def chat_completion(self, **request):
+        # Returns a ChatCompletion
+        ...
+
+    @abstractmethod
+    def stream_chat_completion(self, **request):
+        # Returns an iterable of ChatCompletionChunk with a close() method
+        ...
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+class LLMClient(LLMBackend):
+    """
+    Process-wide chat completion client shared by field validation and chat, for the
+    OpenAI API or any OpenAI-compatible endpoint (base_url).
+
+    - one keep-alive HTTP connection pool for every request;
+    - request and token buckets, adjusted to the x-ratelimit-* headers of each response;
+    - retries of 429/5xx/connection errors with full-jitter exponential backoff,
+      waiting at least as long as Retry-After says;
+    - identical non-streaming requests in flight at the same time share one API call.
+    """
+
+    def __init__(self, api_key=OPEN_API_KEY, base_url=None, max_connections=LLM_MAX_CONNECTIONS,
+                 timeout=LLM_TIMEOUT, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=LLM_TOKENS_PER_MINUTE, max_retries=LLM_MAX_RETRIES,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX, name="openai"):
+        self.name = name
+        self.http_client = DefaultHttpxClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+        # Retries are done here, with the shared rate limiter, not inside the SDK
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.inflight_lock = threading.Lock()
+        self.inflight = {}  # request key -> Future of the call in progress
+
+        self.stats_lock = threading.Lock()
+        self.counters = {"requests": 0, "coalesced": 0, "retries": 0, "rate_limited": 0, "failures": 0}
+        self.throttled_seconds = 0.0
+
+    def count(self, name, amount=1):
+        with self.stats_lock:
+            self.counters[name] += amount
+        LLM_EVENTS.inc(amount, event=name)
+
+    def chat_completion(self, **request):
+        """
+        chat.completions.create with rate limiting, retries and in-flight deduplication.
+        """
+        key = request_key(request)
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+        if not owner:
+            self.count("coalesced")
+            return future.result()
+
+        try:
+            response = self._call(request, stream=False)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.inflight_lock:
+                del self.inflight[key]
+
+    def stream_chat_completion(self, **request):
+        """
+        Streaming chat.completions.create. Only opening the stream is retried; once
+        tokens have been sent to the caller an error is passed on.
+        """
+        return self._call(request, stream=True)
+
+    def _call(self, request, stream):
+        for attempt in range(self.max_retries + 1):
+            waited = self.request_bucket.acquire(1) + self.token_bucket.acquire(estimate_tokens(request))
+            with self.stats_lock:
+                self.counters["requests"] += 1
+                self.throttled_seconds += waited
+            LLM_EVENTS.inc(event="requests")
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(**request, stream=stream)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    self.count("failures")
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                wait = retry_after(e)
+                if isinstance(e, openai.RateLimitError):
+                    self.count("rate_limited")
+                    # Hold back every other caller too, not just this one
+                    self.request_bucket.pause(wait if wait is not None else delay)
+                if wait is not None:
+                    delay = max(delay, wait)
+                self.count("retries")
+                time.sleep(delay)
+                continue
+            self._follow_limits(raw.headers)
+            response = raw.parse()
+            if not stream:
+                record_usage(response)
+            return response
+
+    def _follow_limits(self, headers):
+        limit = header_int(headers, "x-ratelimit-limit-requests")
+        if limit:
+            self.request_bucket.set_limit(limit)
+        limit = header_int(headers, "x-ratelimit-limit-tokens")
+        if limit:
+            self.token_bucket.set_limit(limit)
+        remaining = header_int(headers, "x-ratelimit-remaining-requests")
+        if remaining is not None:
+            self.request_bucket.set_remaining(remaining)
+        remaining = header_int(headers, "x-ratelimit-remaining-tokens")
+        if remaining is not None:
+            self.token_bucket.set_remaining(remaining)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "backend": self.name,
+                **self.counters,
+                "throttled_seconds": self.throttled_seconds,
+                "requests_per_minute_limit": self.request_bucket.capacity,
+                "tokens_per_minute_limit": self.token_bucket.capacity,
+                "in_flight": len(self.inflight),
+            }
+
+    def close(self):
+        self.http_client.close()
+
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def create_llm_client(backend=LLM_BACKEND):
+    if backend == "openai":
+        return LLMClient()
+    if backend == "local":
+        # Self-hosted server speaking the OpenAI API (vLLM, llama.cpp, Ollama, ...). Without a
+        # base URL the SDK would send the form data to api.openai.com instead
+        if not LLM_BASE_URL:
+            raise ValueError("LLM_BACKEND 'local' requires LLM_BASE_URL")
+        return LLMClient(api_key=OPEN_API_KEY or "local", base_url=LLM_BASE_URL, name="local")
+    if backend == "stub":
+        from services.ml_services.llm_stub import StubLLMClient
+        return StubLLMClient()
+    raise ValueError(f"Unknown LLM_BACKEND '{backend}', expected 'openai', 'local' or 'stub'")
+
+
+def get_llm_client():
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = create_llm_client()
+        return _llm_client
+
+
+def close_llm_client():
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is not None:
+            _llm_client.close()
+            _llm_client = None
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import re
+import threading
+import time
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from services.ml_services.llm_client import LLMBackend, record_usage
+from utils.environment_variables import LLM_STUB_LATENCY, LLM_STUB_TOKEN_LATENCY, LLM_STUB_INVALID_RATE
+
+SINGLE_FIELD_PATTERN = re.compile(r"Field Name: (.*)\n\s*Field Value: (.*)\n")
+BATCH_FIELDS_PATTERN = re.compile(r"Fields:\s*(\[.*\])", re.S)
+
+STUB_INVALID_REASON = "Invalid: Stub verdict for load testing."
+
+
+def stub_verdict(field_name, field_value, invalid_rate):
+    # The same field always gets the same verdict, alone or in a batch
+    digest = hashlib.sha256(f"{field_name}\0{field_value}".encode("utf-8")).digest()
+    return STUB_INVALID_REASON if int.from_bytes(digest[:4], "big") / 2 ** 32 < invalid_rate else "Valid"
+
+
+class StubStream:
+    # Iterable of ChatCompletionChunk with the close() of an SDK stream
+    def __init__(self, chunks, token_latency):
+        self.chunks = chunks
+        self.token_latency = token_latency
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.closed:
+                return
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class StubLLMClient(LLMBackend):
+    """
+    In-process, deterministic stand-in for the LLM, for load tests and benchmarks
+    without network access. Every request sleeps `latency` seconds (streams also sleep
+    `token_latency` per chunk). Validation prompts get 'Valid' or a fixed 'Invalid'
+    verdict chosen by a hash of the field, `invalid_rate` of the time; anything else
+    gets a canned answer that quotes the last user message.
+    """
+
+    def __init__(self, latency=LLM_STUB_LATENCY, token_latency=LLM_STUB_TOKEN_LATENCY,
+                 invalid_rate=LLM_STUB_INVALID_RATE):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.invalid_rate = invalid_rate
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def reply(self, request):
+        prompt = request["messages"][-1]["content"]
+        batch = BATCH_FIELDS_PATTERN.search(prompt)
+        if request.get("response_format", {}).get("type") == "json_object" and batch:
+            fields = json.loads(batch.group(1))
+            return json.dumps({
+                field["id"]: stub_verdict(field["field_name"], field["field_value"], self.invalid_rate)
+                for field in fields
+            })
+        single = SINGLE_FIELD_PATTERN.search(prompt)
+        if single:
+            return stub_verdict(single.group(1), single.group(2), self.invalid_rate)
+        return f"Stub answer to: {prompt.strip()[:200]}"
+
+    def _start(self, request):
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.reply(request)
+
+    def chat_completion(self, **request):
+        text = self._start(request)
+        # Token usage estimated at about 4 characters per token, like the real client's budget
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in request["messages"]) // 4
+        completion_tokens = len(text) // 4
+        response = ChatCompletion(
+            id="stub", object="chat.completion", created=int(time.time()), model=request.get("model", "stub"),
+            choices=[{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                   "total_tokens": prompt_tokens + completion_tokens},
+        )
+        record_usage(response)
+        return response
+
+    def stream_chat_completion(self, **request):
+        text = self._start(request)
+        created = int(time.time())
+        chunks = [
+            ChatCompletionChunk(
+                id="stub", object="chat.completion.chunk", created=created, model=request.get("model", "stub"),
+                choices=[{"index": 0, "delta": {"content": token}}],
+            )
+            for token in re.findall(r"\S+\s*", text)
+        ]
+        return StubStream(chunks, self.token_latency)
+
+    def stats(self):
+        with self.lock:
+            return {"backend": "stub", "requests": self.requests, "latency": self.latency,
+                    "invalid_rate": self.invalid_rate}
@@ -0,0 +1,88 @@
+# PyMuPDF work that runs inside the process pool.
+# Functions take a local file path rather than PDF bytes, so documents are not copied
+# through the pool pipe, and this module must stay free of MinIO/OpenAI/database
+# imports so pool processes start quickly.
+import resource
+import shutil
+
+import fitz
+
+from services.ml_services.extraction import extract_document
+from services.ml_services.instruction_rules import compile_snippets
+
+
+def with_peak_rss(func, *args):
+    """
+    Runs func(*args) and returns (result, peak RSS of this pool process in kilobytes).
+    The peak covers the process's lifetime, so it also reflects earlier tasks it ran.
+    """
+    result = func(*args)
+    return result, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def extract_widgets(pdf_path):
+    """
+    Returns a Widget (field_name, field_value, page_number, (x0, y0, x1, y1), field_type) per form widget.
+    """
+    return extract_document(pdf_path, words=False).widgets
+
+
+def draw_anomalies(pdf_document, anomalies):
+    # anomalies: (page_number, rect, reason)
+    for page_number, rect, reason in anomalies:
+        page = pdf_document[page_number]
+        page.draw_rect(rect, color=(1, 0, 0), width=1)
+        annot = page.add_text_annot(rect, reason)
+        annot.set_colors(stroke=(1, 0, 0))
+        annot.update()
+
+
+def save_options(compress):
+    # Compressed output drops unused objects and deflates every stream
+    return {"garbage": 3, "deflate": True} if compress else {}
+
+
+def annotate_document(pdf_path, anomalies, output_pdf_path=None, incremental=False, compress=False):
+    """
+    Draws the anomalies and returns the annotated PDF as bytes, or writes it to
+    output_pdf_path (and returns None) if one is given.
+
+    incremental=True (file output only) appends just the new annotation objects to a
+    copy of the original instead of rewriting the whole document.
+    """
+    if output_pdf_path is not None and incremental:
+        shutil.copyfile(pdf_path, output_pdf_path)
+        pdf_path = output_pdf_path
+
+    rewritten = None
+    pdf_document = fitz.open(pdf_path)
+    try:
+        draw_anomalies(pdf_document, anomalies)
+        if output_pdf_path is None:
+            return pdf_document.tobytes(**save_options(compress))
+        if not incremental:
+            pdf_document.save(output_pdf_path, **save_options(compress))
+        elif pdf_document.can_save_incrementally():
+            pdf_document.save(output_pdf_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP, deflate=compress)
+        else:
+            # A damaged original has to be rewritten in full (once the copy is closed)
+            rewritten = pdf_document.tobytes(**save_options(compress))
+    finally:
+        pdf_document.close()
+    if rewritten is not None:
+        with open(output_pdf_path, "wb") as f:
+            f.write(rewritten)
+
+
+def compile_instructions(pdf_path):
+    """
+    Parses an instruction document into rule snippets with their extracted constraints.
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        page_blocks = [
+            (page_number, block[4])
+            for page_number, page in enumerate(pdf_document)
+            for block in page.get_text("blocks")
+            if block[6] == 0  # Text blocks only, no images
+        ]
+    return compile_snippets(page_blocks)
@@ -0,0 +1,116 @@
+import math
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def entry_text(entry):
+    return f"{entry['field_name']} {entry['field_value']} {entry['reason']} page {entry['page_number']}"
+
+
+def entry_key(entry):
+    return (entry["field_name"], entry["field_value"], entry["reason"], entry["page_number"])
+
+
+class KnowledgeBaseIndex:
+    """
+    Okapi BM25 index over knowledge base entries.
+
+    Entries can be added and removed one at a time; document frequencies and the
+    average length are kept up to date, so syncing with a rewritten knowledge base
+    only touches the entries that changed.
+
+    text_of and key_of let the index hold other kinds of entries (e.g. instruction
+    snippets).
+    """
+
+    def __init__(self, k1=1.5, b=0.75, text_of=entry_text, key_of=entry_key):
+        self.k1 = k1
+        self.b = b
+        self.text_of = text_of
+        self.key_of = key_of
+        self.entries = {}  # key -> (entry, term counts, length, insertion order)
+        self.postings = {}  # term -> set of keys
+        self.total_length = 0
+        self.next_order = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        key = self.key_of(entry)
+        if key in self.entries:
+            return
+        terms = Counter(tokenize(self.text_of(entry)))
+        length = sum(terms.values())
+        self.entries[key] = (entry, terms, length, self.next_order)
+        self.next_order += 1
+        self.total_length += length
+        for term in terms:
+            self.postings.setdefault(term, set()).add(key)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        _, terms, length, _ = entry
+        self.total_length -= length
+        for term in terms:
+            keys = self.postings[term]
+            keys.discard(key)
+            if not keys:
+                del self.postings[term]
+
+    def sync(self, entries):
+        """
+        Makes the index hold exactly `entries`, adding and removing only the difference.
+        """
+        wanted = {self.key_of(entry): entry for entry in entries}
+        for key in list(self.entries):
+            if key not in wanted:
+                self.remove(key)
+        for entry in entries:
+            self.add(entry)
+
+    def search(self, query, k, fill=True):
+        """
+        Returns up to k entries ranked by BM25 score. Unless fill is False, entries that
+        do not match the query fill the remaining slots in their original order, so a
+        generic question still gets some context.
+        """
+        if fill and len(self.entries) <= k:
+            return self.ordered_entries()
+        if not self.entries:
+            return []
+
+        n = len(self.entries)
+        average_length = self.total_length / n
+        scores = Counter()
+        for term in set(tokenize(query)):
+            keys = self.postings.get(term)
+            if not keys:
+                continue
+            idf = math.log(1 + (n - len(keys) + 0.5) / (len(keys) + 0.5))
+            for key in keys:
+                _, terms, length, _ = self.entries[key]
+                tf = terms[term]
+                scores[key] += idf * tf * (self.k1 + 1) / (
+                    tf + self.k1 * (1 - self.b + self.b * length / average_length)
+                )
+
+        ranked = [key for key, _ in scores.most_common(k)]
+        if fill and len(ranked) < k:
+            chosen = set(ranked)
+            ranked += [
+                key for key in sorted(self.entries, key=lambda key: self.entries[key][3])
+                if key not in chosen
+            ][:k - len(ranked)]
+        return [self.entries[key][0] for key in ranked]
+
+    def ordered_entries(self):
+        return [entry for entry, _, _, _ in sorted(self.entries.values(), key=lambda item: item[3])]
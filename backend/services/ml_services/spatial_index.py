@@ -0,0 +1,103 @@
+import numpy as np
+
+DEFAULT_CELL_SIZE = 50.0  # Points; roughly a couple of text lines
+
+# cell key = cy * KEY_STRIDE + cx, unique while |cx| < KEY_STRIDE / 2
+KEY_STRIDE = 1 << 32
+
+
+class WordGridIndex:
+    """
+    Grid bucket index over the word boxes of one page.
+
+    Words are bucketed by the cell of their top-left corner. A word can only lie inside
+    an (expanded) field rect if that corner does, so a query only looks at the cells
+    the rect covers and runs the containment test as one vectorized NumPy expression
+    over those candidates.
+    """
+
+    def __init__(self, x0, y0, x1, y1, cell_size=DEFAULT_CELL_SIZE):
+        self.x0 = np.asarray(x0, dtype=np.float64)
+        self.y0 = np.asarray(y0, dtype=np.float64)
+        self.x1 = np.asarray(x1, dtype=np.float64)
+        self.y1 = np.asarray(y1, dtype=np.float64)
+        self.cell_size = cell_size
+
+        keys = self._cells(self.y0) * KEY_STRIDE + self._cells(self.x0)
+        self.order = np.argsort(keys, kind="stable")
+        unique_keys, starts = np.unique(keys[self.order], return_index=True)
+        ends = np.append(starts[1:], len(keys))
+        self.buckets = dict(zip(unique_keys.tolist(), zip(starts.tolist(), ends.tolist())))
+
+    def __len__(self):
+        return len(self.x0)
+
+    def _cells(self, values):
+        return np.floor(values / self.cell_size).astype(np.int64)
+
+    def query(self, rect, margin=0.0):
+        """
+        Indices (in original word order) of the words fully inside rect grown by margin.
+        rect is (x0, y0, x1, y1).
+        """
+        left, top = rect[0] - margin, rect[1] - margin
+        right, bottom = rect[2] + margin, rect[3] + margin
+        if right < left or bottom < top or not len(self):
+            return np.empty(0, dtype=np.int64)
+
+        first_cx, last_cx = int(np.floor(left / self.cell_size)), int(np.floor(right / self.cell_size))
+        first_cy, last_cy = int(np.floor(top / self.cell_size)), int(np.floor(bottom / self.cell_size))
+
+        if (last_cx - first_cx + 1) * (last_cy - first_cy + 1) > len(self.buckets):
+            # Rect covers more cells than there are occupied buckets; scan everything
+            candidates = np.arange(len(self), dtype=np.int64)
+        else:
+            chunks = []
+            for cy in range(first_cy, last_cy + 1):
+                for cx in range(first_cx, last_cx + 1):
+                    bucket = self.buckets.get(cy * KEY_STRIDE + cx)
+                    if bucket is not None:
+                        chunks.append(self.order[bucket[0]:bucket[1]])
+            if not chunks:
+                return np.empty(0, dtype=np.int64)
+            candidates = np.concatenate(chunks)
+
+        inside = (
+            (self.x0[candidates] >= left) & (self.x1[candidates] <= right) &
+            (self.y0[candidates] >= top) & (self.y1[candidates] <= bottom)
+        )
+        return np.sort(candidates[inside])
+
+
+def match_fields_on_pages(pages, fields, margin=20):
+    """
+    Finds the words near each field.
+
+    pages: one (texts, x0, y0, x1, y1) tuple of word columns per page.
+    fields: dicts with "name", "rect" and optionally "page" (0-based); a field with a
+    page is only matched against that page, one without is matched against all.
+
+    Returns {"field", "page" (1-based), "text"} dicts in page, field, word order.
+    """
+    fields_by_page = {}
+    unplaced = []
+    for position, field in enumerate(fields):
+        if field.get("page") is None:
+            unplaced.append((position, field))
+        else:
+            fields_by_page.setdefault(field["page"], []).append((position, field))
+
+    nearby_text = []
+    for page_num, (texts, x0, y0, x1, y1) in enumerate(pages):
+        page_fields = sorted(fields_by_page.get(page_num, []) + unplaced, key=lambda item: item[0])
+        if not page_fields or not len(texts):
+            continue
+        index = WordGridIndex(x0, y0, x1, y1)
+        for _, field in page_fields:
+            for word_index in index.query(field["rect"], margin):
+                nearby_text.append({
+                    "field": field["name"],
+                    "page": page_num + 1,
+                    "text": texts[word_index]
+                })
+    return nearby_text
@@ -1,209 +1,452 @@
 import os
-from io import BytesIO
+import resource
+import time
+import uuid
+from contextlib import contextmanager
 
 import fitz
-from openai import OpenAI
 import json
 
-from services.minio_service import get_file_from_minio
-from utils.environment_variables import OPEN_API_KEY
+from services.anomaly_service import ANOMALY_STORE
+from services.blob_cache import BLOB_CACHE
+from services.instruction_service import INSTRUCTION_RULES_STORE
+from services.ml_services.extraction import extract_document
+from services.ml_services.field_validator import FieldValidator
+from services.ml_services.llm_client import get_llm_client
+from services.ml_services.pdf_tasks import extract_widgets, annotate_document, draw_anomalies, save_options, with_peak_rss
+from services.ml_services.retrieval import KnowledgeBaseIndex
+from services.revision_service import REVISION_STORE, widget_fingerprint
+from utils.environment_variables import (
+    REVISION_TRACKING_ENABLED,
+    LLM_MODEL,
+    CHAT_HISTORY_MAX_MESSAGES,
+    CHAT_HISTORY_MAX_CHARS,
+    CHAT_CONTEXT_TOP_K,
+)
+from utils.metrics import STAGE_SECONDS, DOCUMENTS, FIELDS_EXTRACTED, ANOMALIES, LLM_CALL_SECONDS, span
+from utils.worker_pool import run_in_process, run_in_thread
 
 
 class Field:
-    def __init__(self, field_name, field_value, page_number, position):
+    def __init__(self, field_name, field_value, page_number, position, field_type=None):
         self.field_name = field_name.strip() if field_name else "Unnamed Field"
         self.field_value = field_value.strip() if field_value else ""
         self.page_number = page_number
         self.position = position  # Rectangle area of the form field
+        self.field_type = field_type  # PyMuPDF widget type, e.g. "Text" or "CheckBox"
+        self.instructions = None  # What the instruction document says about this field, if anything
         self.reason = None  # To store the reason if the field is invalid
 
 
 class PDFProcessor:
-    def __init__(self, pdf_path, output_pdf_path):
+    def __init__(self, pdf_path, output_pdf_path, document_id=None, session_id=None, incremental_save=False,
+                 compress_output=False, instructions_path=None, validator=None):
         self.pdf_path = pdf_path
-        self.output_pdf_path = output_pdf_path
+        self.instructions_path = instructions_path  # Instruction document in MinIO that grounds validation
+        self.output_pdf_path = output_pdf_path  # None keeps the annotated PDF in memory (annotated_pdf)
+        self.incremental_save = incremental_save  # Append the annotations to a copy of the original
+        self.compress_output = compress_output
+        self.annotated_pdf = None  # Bytes of the annotated PDF when output_pdf_path is None
+        self.validation_results = []  # ValidationResult per field of the last validate_fields
+        self.fields_reused = 0  # Verdicts taken over from the previous revision
+        self.document_id = document_id or uuid.uuid4().hex  # Key of this run's anomalies in the anomaly store
+        self.session_id = session_id
         self.fields = []
         self.anomalous_fields = []
         self.knowledge_base = []
-        self.client = OpenAI(api_key=OPEN_API_KEY)
+        self.client = get_llm_client()  # Shared by every run: pooled connections, one rate limit
+        # A SharedFieldValidator when the document is part of a batch
+        self.validator = validator or FieldValidator(self.client)
+        self.pdf_document = None  # Parsed once per run and shared by every stage
+        self.local_path = None  # Local copy of the PDF in the blob cache
+        self.pinned_path = None  # local_path while it is pinned in the blob cache
+        self.stage_timings = {}  # Stage name -> seconds
+        self.peak_rss_kb = None  # Of this process
+        self.pool_peak_rss_kb = None  # Of the pool processes that ran this document's stages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def fetch_file(self):
+        # Resolve the object to a local file once per run; repeated runs on the same
+        # object version are served from the blob cache without a download
+        if self.local_path is None:
+            # Pinned until close(): the annotate stage reopens the file after validation
+            self.local_path = self.pinned_path = BLOB_CACHE.get_path(self.pdf_path, pin=True)
+        return self.local_path
 
     def open_file(self):
-        file_data = get_file_from_minio(self.pdf_path)
-        pdf_data = BytesIO(file_data)
-        pdf_document = fitz.open(stream=pdf_data, filetype="pdf")
-        return pdf_document
+        if self.pdf_document is None:
+            self.pdf_document = fitz.open(self.fetch_file())
+        return self.pdf_document
+
+    def close(self):
+        if self.pdf_document is not None:
+            self.pdf_document.close()
+            self.pdf_document = None
+        if self.pinned_path is not None:
+            BLOB_CACHE.release(self.pinned_path)
+            self.pinned_path = None
+        self.local_path = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_timings[name] = time.perf_counter() - start
+            STAGE_SECONDS.observe(self.stage_timings[name], stage=name)
+            # ru_maxrss is reported in kilobytes on Linux
+            self.peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def report_timings(self):
+        if not self.stage_timings:
+            return
+        timings = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.stage_timings.items())
+        memory = f"peak RSS {self.peak_rss_kb / 1024:.1f} MB"
+        if self.pool_peak_rss_kb is not None:
+            memory += f", pool process peak RSS {self.pool_peak_rss_kb / 1024:.1f} MB"
+        print(f"Stage timings: {timings}; {memory}")
+
+    async def run_pool_stage(self, func, *args):
+        # The parsing and annotation of the async path run in pool processes, whose memory
+        # the API process's ru_maxrss does not include; each task reports its own
+        result, peak_rss_kb = await run_in_process(with_peak_rss, func, *args)
+        self.pool_peak_rss_kb = max(self.pool_peak_rss_kb or 0, peak_rss_kb)
+        return result
+
+    def set_fields(self, widgets):
+        FIELDS_EXTRACTED.inc(len(widgets))
+        self.fields = [
+            Field(
+                field_name=widget.field_name,
+                field_value=widget.field_value,
+                page_number=widget.page_number,
+                position=fitz.Rect(widget.rect),
+                field_type=widget.field_type
+            )
+            for widget in widgets
+        ]
 
     def extract_fields(self):
-        self.fields = []
-        # file_data = get_file_from_minio(self.pdf_path)
-        # pdf_data = BytesIO(file_data)
-        pdf_document = self.open_file()
-
-        for page_number in range(len(pdf_document)):
-            page = pdf_document[page_number]
-            widgets = page.widgets()
+        self.set_fields(extract_document(self.open_file(), words=False).widgets)
 
-            if not widgets:
-                continue
+    def validate_fields(self, on_progress=None, known=None):
+        results = self.validator.validate(self.fields, on_progress, known)
+        self.validation_results = results
+        anomalies_before = len(self.anomalous_fields)
 
-            for widget in widgets:
-                field_name = widget.field_name
-                field_value = widget.field_value
-                rect = widget.rect
-
-                field = Field(
-                    field_name=field_name,
-                    field_value=field_value,
-                    page_number=page_number,
-                    position=rect
-                )
-                self.fields.append(field)
-
-        pdf_document.close()
-
-    def validate_fields(self):
-        for field in self.fields:
+        for field, result in zip(self.fields, results):
             field_name = field.field_name
             field_value = field.field_value
 
-            prompt = f"""
-    You are an expert data validator. Given the field name and its value, determine if the value is appropriate for the field.
+            if result.error is not None:
+                print(f"Error validating field '{field_name}': {result.error}")
+                field.reason = f"Exception occurred: {result.error}"
+                self.anomalous_fields.append(field)
+                continue
 
-    Respond in the following format:
-    - If the value is appropriate, respond with 'Valid'.
-    - If the value is not appropriate, respond with 'Invalid: [Reason]', where [Reason] is a brief explanation.
+            validation = result.text
+            if validation.lower().startswith('valid'):
+                continue
+            elif validation.lower().startswith('invalid'):
+                reason = validation.partition(':')[2].strip()
+                field.reason = reason
+                self.anomalous_fields.append(field)
+                self.knowledge_base.append({
+                    "field_name": field_name,
+                    "field_value": field_value,
+                    "reason": reason,
+                    # "coordinates": {
+                    #     "x0": field.position.x0,
+                    #     "y0": field.position.y0,
+                    #     "x1": field.position.x1,
+                    #     "y1": field.position.y1,
+                    # },
+                    "page_number": field.page_number + 1  # Convert to 1-based index
+                })
+            else:
+                field.reason = 'Validation response not understood.'
+                self.anomalous_fields.append(field)
 
-    Field Name: {field_name}
-    Field Value: {field_value}
+        ANOMALIES.inc(len(self.anomalous_fields) - anomalies_before)
 
-    Is the field value appropriate for the field name?
-    """
-            try:
-                response = self.client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=50,
-                    temperature=0,
-                )
-                validation = response.choices[0].message.content.strip()
-
-                if validation.lower().startswith('valid'):
-                    continue
-                elif validation.lower().startswith('invalid'):
-                    reason = validation.partition(':')[2].strip()
-                    field.reason = reason
-                    self.anomalous_fields.append(field)
-                    self.knowledge_base.append({
-                        "field_name": field_name,
-                        "field_value": field_value,
-                        "reason": reason,
-                        # "coordinates": {
-                        #     "x0": field.position.x0,
-                        #     "y0": field.position.y0,
-                        #     "x1": field.position.x1,
-                        #     "y1": field.position.y1,
-                        # },
-                        "page_number": field.page_number + 1  # Convert to 1-based index
-                    })
-                else:
-                    field.reason = 'Validation response not understood.'
-                    self.anomalous_fields.append(field)
-            except Exception as e:
-                print(f"Error validating field '{field_name}': {e}")
-                field.reason = f"Exception occurred: {e}"
-                self.anomalous_fields.append(field)
+    def anomaly_annotations(self):
+        return [
+            (field.page_number, tuple(field.position), field.reason or 'No reason provided.')
+            for field in self.anomalous_fields
+        ]
 
     def annotate_pdf(self):
         pdf_document = self.open_file()
-
-        for field in self.anomalous_fields:
-            page_number = field.page_number
-            rect = field.position
-            reason = field.reason or 'No reason provided.'
-
-            page = pdf_document[page_number]
-            page.draw_rect(rect, color=(1, 0, 0), width=1)
-            annot = page.add_text_annot(rect, reason)
-            annot.set_colors(stroke=(1, 0, 0))
-            annot.update()
-
-        pdf_document.save(self.output_pdf_path)
-        pdf_document.close()
+        draw_anomalies(pdf_document, self.anomaly_annotations())
+        if self.output_pdf_path is None:
+            self.annotated_pdf = pdf_document.tobytes(**save_options(self.compress_output))
+        else:
+            pdf_document.save(self.output_pdf_path, **save_options(self.compress_output))
 
     def save_knowledge_base(self, path="services/ml_services/docs/knowledge_base.json"):
         with open(path, "w") as f:
             json.dump(self.knowledge_base, f, indent=4)
 
-    def process_pdf(self):
-        self.extract_fields()
-        if not self.fields:
-            print("No fields found in the PDF.")
-            return
-
-        print(f"Found {len(self.fields)} fields. Validating with OpenAI API...")
-
-        self.validate_fields()
-        print(f"Detected {len(self.anomalous_fields)} anomalous fields.")
+    async def save_anomalies(self):
+        # Bulk insert of this document's knowledge base, keyed by document and session
+        await ANOMALY_STORE.save(self.document_id, self.session_id, self.pdf_path, self.knowledge_base)
 
-        self.annotate_pdf()
-        print(f"Anomalies have been highlighted in '{self.output_pdf_path}'.")
+    def process_pdf(self):
+        try:
+            with self.stage("open_file"):
+                self.open_file()
+            with self.stage("extract_fields"):
+                self.extract_fields()
+            if not self.fields:
+                print("No fields found in the PDF.")
+                DOCUMENTS.inc(outcome="no_fields")
+                return
+
+            print(f"Found {len(self.fields)} fields. Validating with OpenAI API...")
+
+            with self.stage("validate_fields"):
+                self.validate_fields()
+            print(f"Detected {len(self.anomalous_fields)} anomalous fields.")
+
+            with self.stage("annotate_pdf"):
+                self.annotate_pdf()
+            print(f"Anomalies have been highlighted in '{self.output_pdf_path or 'memory'}'.")
+
+            with self.stage("save_knowledge_base"):
+                self.save_knowledge_base()
+            print(f"Knowledge base saved to 'services/ml_services/docs/knowledge_base.json'.")
+            DOCUMENTS.inc(outcome="processed")
+        except BaseException:
+            DOCUMENTS.inc(outcome="failed")
+            raise
+        finally:
+            self.close()
+            self.report_timings()
+
+    async def process_pdf_async(self, on_progress=None):
+        """
+        Same stages as process_pdf without blocking the event loop: PyMuPDF parsing and
+        annotation run in the process pool, MinIO/OpenAI I/O in threads. The knowledge
+        base goes to the anomaly store under self.document_id instead of the shared
+        JSON file.
+
+        The document is downloaded once but parsed twice: extract_fields and annotate_pdf
+        run in (possibly different) pool processes, and each opens the local file itself.
+
+        on_progress(stage, **counts), if given, is called as the stages advance.
+        """
+        report = on_progress or (lambda stage, **counts: None)
 
-        self.save_knowledge_base()
-        print(f"Knowledge base saved to 'services/ml_services/docs/knowledge_base.json'.")
+        try:
+            report("extracting")
+            with self.stage("open_file"):
+                local_path = await run_in_thread(self.fetch_file)
+            with self.stage("extract_fields"):
+                widgets = await self.run_pool_stage(extract_widgets, local_path)
+            self.set_fields(widgets)
+            report("extracted", fields_total=len(self.fields))
+            if not self.fields:
+                print("No fields found in the PDF.")
+                await self.save_anomalies()
+                DOCUMENTS.inc(outcome="no_fields")
+                return
+
+            print(f"Found {len(self.fields)} fields. Validating with OpenAI API...")
+
+            instructions_hash = ""
+            if self.instructions_path is not None:
+                # Compiled once per instruction document content, then served from the rules store
+                with self.stage("instruction_rules"):
+                    rules = await INSTRUCTION_RULES_STORE.get(self.instructions_path)
+                for field in self.fields:
+                    field.instructions = rules.rules_for(field.field_name)
+                instructions_hash = rules.content_hash
+
+            fingerprint, known = None, None
+            if REVISION_TRACKING_ENABLED:
+                # A resubmitted form only re-validates the fields whose values changed
+                fingerprint = widget_fingerprint(self.fields, instructions_hash)
+                previous = await REVISION_STORE.previous_verdicts(self.session_id, self.pdf_path, fingerprint)
+                known = REVISION_STORE.reusable_verdicts(self.fields, previous)
+                self.fields_reused = sum(verdict is not None for verdict in known)
+                if self.fields_reused:
+                    print(f"Reusing {self.fields_reused} verdicts from the previous revision.")
+
+            report("validating", fields_validated=0, fields_reused=self.fields_reused)
+            with self.stage("validate_fields"):
+                await run_in_thread(
+                    self.validate_fields, lambda done: report("validating", fields_validated=done), known
+                )
+            print(f"Detected {len(self.anomalous_fields)} anomalous fields.")
+
+            report("annotating", anomalies=len(self.anomalous_fields))
+            with self.stage("annotate_pdf"):
+                # Second parse of the document, in the pool process running this task
+                self.annotated_pdf = await self.run_pool_stage(
+                    annotate_document, local_path, self.anomaly_annotations(), self.output_pdf_path,
+                    self.incremental_save, self.compress_output
+                )
+            report("annotated")
+            print(f"Anomalies have been highlighted in '{self.output_pdf_path or 'memory'}'.")
+
+            with self.stage("save_knowledge_base"):
+                await self.save_anomalies()
+                if fingerprint is not None:
+                    # The revision only speeds up the next upload; losing it must not fail this one
+                    try:
+                        await REVISION_STORE.save(self.session_id, self.pdf_path, fingerprint, self.document_id,
+                                                  self.fields, self.validation_results)
+                    except Exception as e:
+                        print(f"Could not save the revision of '{self.pdf_path}': {e}")
+            print(f"Knowledge base saved for document '{self.document_id}'.")
+            DOCUMENTS.inc(outcome="processed")
+        except BaseException:
+            DOCUMENTS.inc(outcome="failed")
+            raise
+        finally:
+            await run_in_thread(self.close)
+            self.report_timings()
 
 
 class ChatProcessor:
-    def __init__(self, knowledge_base_path):
+    def __init__(self, knowledge_base_path, client=None):
         self.knowledge_base_path = knowledge_base_path
-        self.client = OpenAI(api_key=OPEN_API_KEY)
+        self.client = client or get_llm_client()
+        self.knowledge_base_mtime = None
+        self.index = KnowledgeBaseIndex()
         self.load_knowledge_base()
         self.sessions = {}  # To store conversation history for each session
 
     def load_knowledge_base(self):
         try:
+            self.knowledge_base_mtime = os.path.getmtime(self.knowledge_base_path)
             with open(self.knowledge_base_path, "r") as f:
                 self.knowledge_base = json.load(f)
         except FileNotFoundError:
+            self.knowledge_base_mtime = None
             self.knowledge_base = []
-        print(self.knowledge_base)
+        # Only entries that changed since the last load are (re)indexed
+        self.index.sync(self.knowledge_base)
+        print(f"Loaded {len(self.knowledge_base)} knowledge base entries.")
 
-    def get_response(self, user_query, session_id):
-        if session_id not in self.sessions:
-            self.sessions[session_id] = []
-
-        # Add user query to session history
-        self.sessions[session_id].append({"role": "user", "content": user_query})
+    def refresh_knowledge_base(self):
+        # Re-read the file only when a new document run has rewritten it
+        try:
+            mtime = os.path.getmtime(self.knowledge_base_path)
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.knowledge_base_mtime:
+            self.load_knowledge_base()
 
-        # Build context from the knowledge base
-        anomalies_summary = "\n".join([
+    def relevant_anomalies(self, user_query, index):
+        # Only the top-k entries for the query go into the prompt, not the whole knowledge base
+        return "\n".join([
             f"- Field '{item['field_name']}' on page {item['page_number']}: {item['reason']}"
-            for item in self.knowledge_base
+            for item in index.search(user_query, CHAT_CONTEXT_TOP_K)
         ])
 
-        context = f"""
-    The following anomalies were detected in the document:
+    def build_context(self, user_query, index=None):
+        # Build context from the knowledge base (the document's index, or the JSON file's)
+        index = index if index is not None else self.index
+        anomalies_summary = self.relevant_anomalies(user_query, index)
+        if len(index) > CHAT_CONTEXT_TOP_K:
+            heading = (f"{len(index)} anomalies were detected in the document; "
+                       f"the ones most relevant to the query are:")
+        else:
+            heading = "The following anomalies were detected in the document:"
+
+        return f"""
+    {heading}
     {anomalies_summary}
 
     User Query: {user_query}
 
     Respond to the query using the context above.
     """
-        # Add the context as a system message at the start of the session
-        if len(self.sessions[session_id]) == 1:  # First interaction
-            self.sessions[session_id].insert(0, {"role": "system", "content": context})
 
-        try:
-            # Generate response
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=self.sessions[session_id],
+    def build_prompt(self, history, user_query, index=None):
+        """
+        Messages sent for a new user query: the knowledge base context, built from the
+        current index for this query, then the conversation so far and the query.
+
+        The context is rebuilt on every turn and never stored in the history, so a
+        session always talks about the document's current anomalies. System messages
+        stored by older versions are dropped from the history.
+        """
+        index = index if index is not None else self.index
+        return (
+            [{"role": "system", "content": self.build_context(user_query, index)}]
+            + [message for message in history if message["role"] != "system"]
+            + [{"role": "user", "content": user_query}]
+        )
+
+    @staticmethod
+    def trim_history(messages, max_messages=CHAT_HISTORY_MAX_MESSAGES, max_chars=CHAT_HISTORY_MAX_CHARS):
+        """
+        Bounds the prompt size: keeps the system message plus the most recent messages
+        that fit in max_messages and max_chars. The latest message is always kept.
+        """
+        system = [message for message in messages[:1] if message["role"] == "system"]
+        recent = messages[len(system):][-max_messages:]
+
+        budget = max_chars - sum(len(message["content"]) for message in system)
+        kept = []
+        for message in reversed(recent):
+            budget -= len(message["content"])
+            if kept and budget < 0:
+                break
+            kept.append(message)
+        return system + kept[::-1]
+
+    def complete(self, messages):
+        # Generate response
+        with span(LLM_CALL_SECONDS, operation="chat"):
+            response = self.client.chat_completion(
+                model=LLM_MODEL,
+                messages=self.trim_history(messages),
+                max_tokens=2000,
+                temperature=0.7,
+            )
+        return response.choices[0].message.content.strip()
+
+    def stream(self, messages):
+        # Same request as complete, yielding the text deltas as they arrive. The span
+        # covers the whole stream, up to the last token
+        with span(LLM_CALL_SECONDS, operation="chat_stream"):
+            response = self.client.stream_chat_completion(
+                model=LLM_MODEL,
+                messages=self.trim_history(messages),
                 max_tokens=2000,
                 temperature=0.7,
             )
-            assistant_response = response.choices[0].message.content.strip()
+            try:
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                response.close()
+
+    def get_response(self, user_query, session_id):
+        if session_id not in self.sessions:
+            self.sessions[session_id] = []
+
+        self.refresh_knowledge_base()
+        messages = self.build_prompt(self.sessions[session_id], user_query)
+
+        try:
+            assistant_response = self.complete(messages)
 
-            # Add assistant response to session history
-            self.sessions[session_id].append({"role": "assistant", "content": assistant_response})
+            # Add the query and the assistant response to session history
+            self.sessions[session_id].extend([
+                {"role": "user", "content": user_query},
+                {"role": "assistant", "content": assistant_response},
+            ])
 
             return assistant_response
         except Exception as e:
@@ -211,17 +454,18 @@ class ChatProcessor:
 
 
 if __name__ == "__main__":
-    # Path to the PDF
+    # Run from the backend directory; the LLM client takes its key and backend from the
+    # environment (OPEN_API_KEY, LLM_BACKEND, ...)
     pdf_path = "new.pdf"
     output_pdf_path = "new_with_anomalies.pdf"
-    openai_api_key = os.getenv("OPENAI_API")
-    knowledge_base_path = "docs/knowledge_base.json"
-    # Instantiate the PDFProcessor
-    processor = PDFProcessor(pdf_path, output_pdf_path, openai_api_key)
+    knowledge_base_path = "services/ml_services/docs/knowledge_base.json"
+    # Instantiate the PDFProcessor on a local file instead of a MinIO object
+    processor = PDFProcessor(pdf_path, output_pdf_path)
+    processor.local_path = pdf_path
     # Process the PDF
     processor.process_pdf()
 
-    chat_processor = ChatProcessor(knowledge_base_path, openai_api_key)
+    chat_processor = ChatProcessor(knowledge_base_path)
     session_id = "user_1234"  # Unique session identifier
     print("\nStarting chat session...")
 
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.environment_variables import (
+    VALIDATION_CACHE_ENABLED,
+    VALIDATION_CACHE_PATH,
+    VALIDATION_CACHE_MEMORY_SIZE,
+    VALIDATION_CACHE_DISK_SIZE,
+    VALIDATION_CACHE_TTL,
+)
+
+
+def normalize_field_name(field_name):
+    # "Date of birth:" and "date  of birth" are the same question
+    return re.sub(r"\s+", " ", field_name or "").strip().rstrip(":").strip().lower()
+
+
+def normalize_field_value(field_value):
+    return re.sub(r"\s+", " ", field_value or "").strip()
+
+
+def make_cache_key(field_name, field_value, version):
+    raw = "\x1f".join([normalize_field_name(field_name), normalize_field_value(field_value), version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """In-process LRU of verdicts with per-entry expiry."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            verdict, expires_at = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return verdict
+
+    def put(self, key, verdict, expires_at):
+        with self.lock:
+            self.entries[key] = (verdict, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskTier:
+    """SQLite-backed verdict store shared by every worker process on the host."""
+
+    PRUNE_EVERY = 500  # Writes between expiry/size sweeps
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "key TEXT PRIMARY KEY, verdict TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS verdicts_accessed_at ON verdicts (accessed_at)")
+            self.connection.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT verdict, expires_at FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self.connection.execute("DELETE FROM verdicts WHERE key = ?", (key,))
+                self.connection.commit()
+                return None
+            self.connection.execute("UPDATE verdicts SET accessed_at = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            return row[0], row[1]
+
+    def put_many(self, items):
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                [(key, verdict, expires_at, now) for key, verdict, expires_at in items],
+            )
+            self.connection.commit()
+            self.writes += len(items)
+            if self.writes >= self.PRUNE_EVERY:
+                self.writes = 0
+                self._prune(now)
+
+    def _prune(self, now):
+        deleted = self.connection.execute("DELETE FROM verdicts WHERE expires_at < ?", (now,)).rowcount
+        count = self.connection.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        if count > self.max_size:
+            deleted += self.connection.execute(
+                "DELETE FROM verdicts WHERE key IN "
+                "(SELECT key FROM verdicts ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_size,),
+            ).rowcount
+        self.connection.commit()
+        self.evictions += deleted
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+
+class VerdictCache:
+    """
+    Two-tier cache of LLM validation verdicts keyed on the normalized field name,
+    field value and prompt/model version. Lookups go memory -> disk; disk hits are
+    promoted into memory.
+    """
+
+    def __init__(self, path=VALIDATION_CACHE_PATH, memory_size=VALIDATION_CACHE_MEMORY_SIZE,
+                 disk_size=VALIDATION_CACHE_DISK_SIZE, ttl=VALIDATION_CACHE_TTL):
+        self.ttl = ttl
+        self.memory = MemoryTier(memory_size, ttl)
+        self.disk = DiskTier(path, disk_size) if path else None
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, key):
+        verdict = self.memory.get(key)
+        if verdict is not None:
+            self._count("memory_hits")
+            return verdict
+
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                verdict, expires_at = row
+                self.memory.put(key, verdict, expires_at)
+                self._count("disk_hits")
+                return verdict
+
+        self._count("misses")
+        return None
+
+    def put_many(self, items):
+        if not items:
+            return
+        expires_at = time.time() + self.ttl
+        for key, verdict in items:
+            self.memory.put(key, verdict, expires_at)
+        if self.disk is not None:
+            self.disk.put_many([(key, verdict, expires_at) for key, verdict in items])
+        self._count("stores", len(items))
+
+    def _count(self, counter, amount=1):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+            "disk_evictions": self.disk.evictions if self.disk is not None else 0,
+        }
+
+
+_verdict_cache = None
+_verdict_cache_lock = threading.Lock()
+
+
+def get_verdict_cache():
+    # One cache per process, created on first use
+    global _verdict_cache
+    if not VALIDATION_CACHE_ENABLED:
+        return None
+    with _verdict_cache_lock:
+        if _verdict_cache is None:
+            _verdict_cache = VerdictCache()
+    return _verdict_cache
@@ -0,0 +1,60 @@
+import hashlib
+import json
+
+from repositories.revision_repository import get_latest_revision, replace_revision
+from services.ml_services.field_validator import PROMPT_VERSION, is_definite
+
+
+def field_key(field):
+    # Identity of a widget across revisions of a form: page, name and (rounded) position
+    rect = field.position
+    return f"{field.page_number}:{field.field_name}:{round(rect.x0)},{round(rect.y0)},{round(rect.x1)},{round(rect.y1)}"
+
+
+def widget_fingerprint(fields, instructions_hash=""):
+    """
+    Hash of the widget set without the values: two uploads with the same fingerprint
+    are revisions of the same form. The prompt version and the instruction document's
+    content hash are mixed in, so verdicts given under another prompt, model or set of
+    instructions are never reused.
+    """
+    digest = hashlib.sha256(f"{PROMPT_VERSION}:{instructions_hash}".encode("utf-8"))
+    for key in sorted(f"{field_key(field)}:{field.field_type or ''}" for field in fields):
+        digest.update(key.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class RevisionStore:
+    """
+    Field verdicts of the latest run per (owner, filename, widget fingerprint), so a
+    corrected upload of a form only re-validates the fields whose values changed.
+    """
+
+    async def previous_verdicts(self, owner, filename, fingerprint) -> dict:
+        revision = await get_latest_revision(owner or "", filename, fingerprint)
+        return json.loads(revision.verdicts) if revision is not None else {}
+
+    async def save(self, owner, filename, fingerprint, document_id, fields, results):
+        # Only definite verdicts are kept; fields that errored are validated again next time
+        verdicts = {
+            field_key(field): [field.field_value, result.text]
+            for field, result in zip(fields, results)
+            if is_definite(result)
+        }
+        await replace_revision(owner or "", filename, fingerprint, document_id, json.dumps(verdicts))
+
+    @staticmethod
+    def reusable_verdicts(fields, previous):
+        """
+        Stored verdict per field whose value is unchanged since the previous revision,
+        None for new or changed fields.
+        """
+        known = []
+        for field in fields:
+            stored = previous.get(field_key(field))
+            known.append(stored[1] if stored is not None and stored[0] == field.field_value else None)
+        return known
+
+
+REVISION_STORE = RevisionStore()
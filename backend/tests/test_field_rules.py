@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+from services.ml_services.field_rules import check_field
+
+
+def date_field(value, name="Date"):
+    return SimpleNamespace(field_name=name, field_value=value, field_type="Text")
+
+
+def test_month_first_date_is_left_to_the_model():
+    assert check_field(date_field("12/31/1990")) is None
+
+
+def test_day_first_date_is_left_to_the_model():
+    assert check_field(date_field("31/12/1990")) is None
+
+
+def test_date_in_neither_order_is_invalid():
+    assert check_field(date_field("02/30/2000")) == "Invalid: The value is not an existing calendar date."
+
+
+def test_iso_date_is_valid():
+    assert check_field(date_field("1990-12-31")) == "Valid"
@@ -1,49 +1,112 @@
 import asyncio
-from sqlalchemy.ext.asyncio import create_async_engine
+import sys
+
+from sqlalchemy import inspect, insert, select, text
+from sqlalchemy.exc import DBAPIError
 
 from models.history_model import History
-from utils.db_utils import Base, async_session
-from utils.environment_variables import DATABASE_URL
+from models.chat_message_model import ChatMessage
+from models.document_model import Document
+from models.anomaly_model import Anomaly
+from models.revision_model import DocumentRevision
+from utils.db_utils import Base, database_engine
+
+# Arbitrary key of the Postgres advisory lock that serialises schema setup
+SCHEMA_LOCK_ID = 7210523
+
+# Every uvicorn worker runs the setup at startup; they take turns, so no two workers
+# create or alter the same table at once. The lock is released when the transaction ends.
+def lock_schema(conn):
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": SCHEMA_LOCK_ID})
 
+def column_definition(conn, column):
+    quote = conn.dialect.identifier_preparer.quote
+    definition = f"{quote(column.name)} {column.type.compile(dialect=conn.dialect)}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        default = default if isinstance(default, str) else default.compile(dialect=conn.dialect)
+        definition += f" DEFAULT {default}"
+    if not column.nullable:
+        if column.server_default is None:
+            # Existing rows would have no value; this needs a hand-written migration
+            raise RuntimeError(f"Cannot add the NOT NULL column {column.table.name}.{column.name} "
+                               f"without a server default to an existing table")
+        definition += " NOT NULL"
+    return definition
 
-# Create an async engine
-database_engine = create_async_engine(DATABASE_URL, echo=True)
+# Brings tables that already existed up to the models. create_all skips existing tables
+# entirely, so columns and indexes added to a model later would never reach an old
+# database. Columns are added as the model declares them; a NOT NULL column needs a
+# server default for the existing rows.
+def migrate_tables(conn):
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {column_definition(conn, column)}"))
+                print(f"Added column {table.name}.{column.name}.")
+        for index in table.indexes:
+            # Looks the index up by name first, so this is a no-op once it exists. A unique
+            # index over existing duplicates cannot be built; that is reported, not fatal
+            try:
+                with conn.begin_nested():
+                    index.create(conn, checkfirst=True)
+            except DBAPIError as e:
+                print(f"Could not create index {index.name} on {table.name}: {e.orig}")
 
-# Function to create all tables asynchronously
+def setup_schema(conn):
+    lock_schema(conn)
+    Base.metadata.create_all(conn)
+    migrate_tables(conn)
+
+# Creates the missing tables, then the missing columns and indexes of existing ones;
+# existing rows are kept
 async def create_tables():
     async with database_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(setup_schema)
     print("All tables created successfully.")
 
-# Function to fill history table with 10 random rows, all having the same username
-async def fill_history_table():
-    async with async_session() as session:
-        async with session.begin():
-            username = "test_user"
-            chat_names = [
-                "General Chat",
-                "Support Chat",
-                "Dev Team Chat",
-                "Marketing Chat",
-                "Sales Chat",
-                "Product Chat",
-                "HR Chat",
-                "Finance Chat",
-                "Random Chat",
-                "Design Chat"
-            ]
-            rows = [
-                History(username=username, chat_name=chat_name)
-                for chat_name in chat_names
-            ]
-            session.add_all(rows)
-        await session.commit()
+# Drops every table; only run from the command line with --reset
+async def drop_tables():
+    async with database_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    print("All tables dropped.")
+
+# Function to fill history table with 10 random rows, all having the same username.
+# Does nothing if the table already has rows, so it is safe on every startup
+def fill_history_table(conn):
+    if conn.execute(select(History.id).limit(1)).first() is not None:
+        return
+    username = "test_user"
+    chat_names = [
+        "General Chat",
+        "Support Chat",
+        "Dev Team Chat",
+        "Marketing Chat",
+        "Sales Chat",
+        "Product Chat",
+        "HR Chat",
+        "Finance Chat",
+        "Random Chat",
+        "Design Chat"
+    ]
+    conn.execute(insert(History), [
+        {"username": username, "chat_name": chat_name}
+        for chat_name in chat_names
+    ])
     print("History table filled with 10 random rows.")
 
-async def main():
-    await create_tables()
-    await fill_history_table()
+# Schema setup and the history rows in one transaction, under the schema lock
+async def main(reset=False):
+    if reset:
+        await drop_tables()
+    async with database_engine.begin() as conn:
+        await conn.run_sync(setup_schema)
+        await conn.run_sync(fill_history_table)
+    print("All tables created successfully.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(reset="--reset" in sys.argv))
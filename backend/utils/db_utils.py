@@ -1,15 +1,51 @@
 import asyncio
+import time
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy import event, text
 from sqlalchemy.ext.declarative import declarative_base
 
-from utils.environment_variables import DATABASE_URL
+from utils.environment_variables import (
+    DATABASE_URL,
+    DATABASE_ECHO,
+    DATABASE_POOL_SIZE,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_RECYCLE,
+)
+from utils.metrics import DB_QUERY_SECONDS
 
 Base = declarative_base()
 
-# Create an async engine
-database_engine = create_async_engine(DATABASE_URL, echo=True)
+# Connection pool sizing for Postgres; SQLite (benchmarks) uses its own unpooled connections
+pool_options = {} if (DATABASE_URL or "").startswith("sqlite") else {
+    "pool_size": DATABASE_POOL_SIZE,
+    "max_overflow": DATABASE_MAX_OVERFLOW,
+    "pool_recycle": DATABASE_POOL_RECYCLE,  # Seconds; drop connections before the server or a proxy does
+    "pool_pre_ping": True,
+}
+
+# The one async engine of the process; every session and the table setup share its pool
+database_engine = create_async_engine(DATABASE_URL, echo=DATABASE_ECHO, **pool_options)
+
+# Statement timings for GET /metrics, labelled by statement type (SELECT, INSERT, ...)
+@event.listens_for(database_engine.sync_engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(database_engine.sync_engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    verb = (statement.split(None, 1) or ["?"])[0].upper()
+    DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=verb)
+
+
+@event.listens_for(database_engine.sync_engine, "handle_error")
+def drop_query_timer(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
 
 # Create a session maker for async sessions
 async_session = sessionmaker(
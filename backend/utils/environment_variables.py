@@ -8,9 +8,105 @@ OPEN_API_KEY = os.getenv("OPEN_API_KEY")
 
 # DATABASE
 DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_ECHO = os.getenv("DATABASE_ECHO", "0") == "1"  # Log every SQL statement
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "10"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "20"))  # Extra connections under bursts
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+# 0: the schema is set up once per deploy with `python -m utils.create_db_tables`, not by every worker
+DATABASE_SETUP_ON_STARTUP = os.getenv("DATABASE_SETUP_ON_STARTUP", "1") == "1"
 
 # MINIO
 MINIO_URL = os.getenv("MINIO_URL")
 MINIO_USER = os.getenv("MINIO_USER")
 MINIO_PASSWORD = os.getenv("MINIO_PASSWORD")
+MINIO_PART_SIZE = int(os.getenv("MINIO_PART_SIZE", str(10 * 1024 * 1024)))  # Multipart chunk size, at least 5 MiB
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", "cache/blobs")
+BLOB_CACHE_SIZE = int(os.getenv("BLOB_CACHE_SIZE", str(2 * 1024 * 1024 * 1024)))  # Bytes kept on local disk
 
+# VALIDATION
+VALIDATION_CONCURRENCY = int(os.getenv("VALIDATION_CONCURRENCY", "8"))  # Parallel LLM requests per document
+VALIDATION_BATCH_SIZE = int(os.getenv("VALIDATION_BATCH_SIZE", "1"))  # Fields packed into one prompt
+VALIDATION_RULES_ENABLED = os.getenv("VALIDATION_RULES_ENABLED", "1") == "1"  # Local checks before the LLM
+
+# VALIDATION CACHE
+VALIDATION_CACHE_ENABLED = os.getenv("VALIDATION_CACHE_ENABLED", "1") == "1"
+VALIDATION_CACHE_PATH = os.getenv("VALIDATION_CACHE_PATH", "cache/validation_cache.sqlite3")  # Empty disables the disk tier
+VALIDATION_CACHE_MEMORY_SIZE = int(os.getenv("VALIDATION_CACHE_MEMORY_SIZE", "10000"))
+VALIDATION_CACHE_DISK_SIZE = int(os.getenv("VALIDATION_CACHE_DISK_SIZE", "1000000"))
+VALIDATION_CACHE_TTL = int(os.getenv("VALIDATION_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds
+
+# PDF PIPELINE
+PDF_PROCESS_WORKERS = int(os.getenv("PDF_PROCESS_WORKERS", str(os.cpu_count() or 1)))  # Processes for PyMuPDF work
+PDF_PIPELINE_CONCURRENCY = int(os.getenv("PDF_PIPELINE_CONCURRENCY", "4"))  # Documents processed at once
+PDF_PIPELINE_QUEUE_DEPTH = int(os.getenv("PDF_PIPELINE_QUEUE_DEPTH", "16"))  # Documents allowed to wait for a slot
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "4"))  # Items a streaming thread may produce ahead of the client
+STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "16"))  # Threads for streamed downloads and chat completions
+
+# JOBS
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Documents processed concurrently by the job queue
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_OUTPUT_DIR = os.getenv("JOB_OUTPUT_DIR", "jobs")
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "3600"))  # Seconds a finished job stays available
+
+# CHAT
+CHAT_SESSION_CACHE_SIZE = int(os.getenv("CHAT_SESSION_CACHE_SIZE", "1000"))  # Sessions kept in memory per worker
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "20"))  # Messages sent besides the system prompt
+CHAT_HISTORY_MAX_CHARS = int(os.getenv("CHAT_HISTORY_MAX_CHARS", "24000"))  # Rough prompt size budget
+CHAT_CONTEXT_TOP_K = int(os.getenv("CHAT_CONTEXT_TOP_K", "15"))  # Knowledge base entries retrieved per question
+
+# ANOMALY STORE
+ANOMALY_CACHE_SIZE = int(os.getenv("ANOMALY_CACHE_SIZE", "500"))  # Documents whose anomalies stay in memory
+
+# LLM CLIENT
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # openai | local (OpenAI-compatible server) | stub
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")  # e.g. http://localhost:8000/v1 for the local backend
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))  # Keep-alive pool size
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # Seconds per request
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))  # Until the API reports its own limits
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "30000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))  # Seconds; doubled per attempt, with jitter
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+
+# LLM STUB (LLM_BACKEND=stub)
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", "0.5"))  # Seconds per request
+LLM_STUB_TOKEN_LATENCY = float(os.getenv("LLM_STUB_TOKEN_LATENCY", "0.02"))  # Seconds per streamed chunk
+LLM_STUB_INVALID_RATE = float(os.getenv("LLM_STUB_INVALID_RATE", "0.1"))  # Share of fields judged invalid
+
+# ANNOTATED OUTPUT
+ANNOTATED_OUTPUT_MODE = os.getenv("ANNOTATED_OUTPUT_MODE", "memory")  # memory | incremental (per-request spool file)
+ANNOTATED_OUTPUT_COMPRESS = os.getenv("ANNOTATED_OUTPUT_COMPRESS", "0") == "1"  # Garbage-collect and deflate
+ANNOTATED_OUTPUT_DIR = os.getenv("ANNOTATED_OUTPUT_DIR", "cache/annotated")  # Spool files of the incremental mode
+ANNOTATED_OUTPUT_CHUNK_SIZE = int(os.getenv("ANNOTATED_OUTPUT_CHUNK_SIZE", str(1024 * 1024)))
+ANNOTATED_OUTPUT_UPLOAD = os.getenv("ANNOTATED_OUTPUT_UPLOAD", "1") == "1"  # Keep results in MinIO
+
+# REVISIONS
+REVISION_TRACKING_ENABLED = os.getenv("REVISION_TRACKING_ENABLED", "1") == "1"  # Reuse verdicts of unchanged fields
+
+# INSTRUCTION RULES
+INSTRUCTION_CACHE_DIR = os.getenv("INSTRUCTION_CACHE_DIR", "cache/instructions")  # Compiled instruction documents
+INSTRUCTION_CACHE_SIZE = int(os.getenv("INSTRUCTION_CACHE_SIZE", "32"))  # Compiled documents kept in memory
+INSTRUCTION_RULES_TOP_K = int(os.getenv("INSTRUCTION_RULES_TOP_K", "2"))  # Snippets per field in the prompt
+INSTRUCTION_RULES_MAX_CHARS = int(os.getenv("INSTRUCTION_RULES_MAX_CHARS", "800"))
+
+# CHAT HISTORY
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "5"))  # Seconds; 0 disables the read cache
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "10000"))  # Users kept in the read cache
+HISTORY_CACHE_PAGES = int(os.getenv("HISTORY_CACHE_PAGES", "20"))  # Pages kept per user
+
+# STARTUP
+PRELOAD_ML_MODULES = os.getenv("PRELOAD_ML_MODULES", "1") == "1"  # Import the ML stack in the background once serving
+READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT", "2"))  # Seconds per dependency check of /ready
+
+
+# INSTRUMENTATION
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"  # Allow per-request profiles with "X-Profile: 1"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))  # Seconds between stack samples
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "20"))  # Profiles kept for GET /profiles/{profile_id}
+
+# BATCH PROCESSING
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))  # Documents of one batch processed at once
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "5000"))
+BATCH_MAX_DOCUMENT_SIZE = int(os.getenv("BATCH_MAX_DOCUMENT_SIZE", str(50 * 1024 * 1024)))  # Bytes per PDF
+BATCH_SPOOL_DIR = os.getenv("BATCH_SPOOL_DIR", "cache/batches")  # Uploaded documents while their batch runs
@@ -0,0 +1,235 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# Seconds; the Prometheus client default buckets plus 30s and 60s for whole documents
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}  # tuple of label values -> value
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    @abstractmethod
+    def samples(self):
+        # Yields (sample name, rendered labels, value)
+        ...
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        for key, value in values:
+            yield self.name, format_labels(self.label_names, key), value
+
+
+class Gauge(Metric):
+    """
+    Either set() from the code, or read from `function` on every scrape.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def samples(self):
+        if self.function is not None:
+            yield self.name, "", self.function()
+            return
+        with self.lock:
+            values = sorted(self.values.items())
+        for key, value in values:
+            yield self.name, format_labels(self.label_names, key), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def samples(self):
+        with self.lock:
+            values = sorted((key, dict(entry, buckets=list(entry["buckets"]))) for key, entry in self.values.items())
+        for key, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry["buckets"]):
+                cumulative += count
+                yield (f"{self.name}_bucket", format_labels(self.label_names, key, [("le", format_value(bound))]),
+                       cumulative)
+            yield f"{self.name}_bucket", format_labels(self.label_names, key, [("le", "+Inf")]), entry["count"]
+            yield f"{self.name}_sum", format_labels(self.label_names, key), entry["sum"]
+            yield f"{self.name}_count", format_labels(self.label_names, key), entry["count"]
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms of this process, rendered in the Prometheus text
+    format by GET /metrics. Every uvicorn worker has its own registry; Prometheus
+    scrapes and sums them per instance.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, metric):
+        with self.lock:
+            # Modules may be imported again (e.g. in process pool workers); keep the first
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), function=None):
+        return self.register(Gauge(name, documentation, labels, function))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+# Document pipeline
+STAGE_SECONDS = METRICS.histogram(
+    "pipeline_stage_seconds", "Duration of a PDFProcessor stage.", ["stage"])
+DOCUMENTS = METRICS.counter(
+    "pipeline_documents_total", "Documents run through the pipeline, by outcome.", ["outcome"])
+FIELDS_EXTRACTED = METRICS.counter(
+    "pipeline_fields_extracted_total", "Form fields extracted from documents.")
+FIELDS_VALIDATED = METRICS.counter(
+    "pipeline_fields_validated_total",
+    "Field verdicts, by where they came from (revision, rules, cache or llm).", ["source"])
+ANOMALIES = METRICS.counter(
+    "pipeline_anomalies_total", "Fields flagged as anomalous.")
+
+# LLM
+LLM_CALL_SECONDS = METRICS.histogram(
+    "llm_call_seconds", "Duration of an LLM call, including retries and rate limiting.", ["operation"])
+LLM_EVENTS = METRICS.counter(
+    "llm_client_events_total", "LLM client requests, retries, rate limits, failures and coalesced calls.",
+    ["event"])
+LLM_TOKENS = METRICS.counter(
+    "llm_tokens_total", "Tokens reported by the LLM, by kind (prompt or completion).", ["kind"])
+
+# Storage
+MINIO_REQUEST_SECONDS = METRICS.histogram(
+    "minio_request_seconds", "Duration of a MinIO call.", ["operation"])
+DB_QUERY_SECONDS = METRICS.histogram(
+    "db_query_seconds", "Duration of a database statement, by statement type.", ["statement"])
+
+# API
+HTTP_REQUEST_SECONDS = METRICS.histogram(
+    "http_request_seconds", "Time from receiving a request to the end of its response body.",
+    ["method", "route", "status"])
+
+
+@contextmanager
+def span(histogram, **labels):
+    """
+    Times the block into histogram, also when it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware observing HTTP_REQUEST_SECONDS per route template (not per raw
+    path, so ids do not blow up the label set). Streaming responses are timed until
+    their last chunk has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=scope["method"],
+                route=getattr(route, "path", "unmatched"), status=status,
+            )
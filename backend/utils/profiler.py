@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from urllib.parse import parse_qs
+
+from utils.environment_variables import PROFILING_ENABLED, PROFILE_INTERVAL, PROFILE_HISTORY
+
+PROFILE_HEADER = b"x-profile"
+
+# Innermost frames of pool threads parked waiting for work; sampling them only adds noise
+IDLE_FRAMES = {"thread.py:_worker", "threading.py:wait"}
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread (the event loop and the worker threads
+    doing MinIO/LLM/validation work) each `interval` seconds while running, and
+    counts identical stacks. Work in the process pool is not sampled, and requests
+    running at the same time show up in each other's samples.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+        self.started_at = None
+        self.duration = 0.0
+
+    def sample(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                if stack[0] in IDLE_FRAMES:
+                    continue
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def folded(self):
+        # "frame;frame;frame count" lines, the input of flamegraph.pl and speedscope
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+class ProfileStore:
+    # The last `size` profiles, served by GET /profiles/{profile_id}
+    def __init__(self, size=PROFILE_HISTORY):
+        self.size = size
+        self.lock = threading.Lock()
+        self.profiles = OrderedDict()
+
+    def put(self, profile_id, profile):
+        with self.lock:
+            self.profiles[profile_id] = profile
+            while len(self.profiles) > self.size:
+                self.profiles.popitem(last=False)
+
+    def get(self, profile_id):
+        with self.lock:
+            return self.profiles.get(profile_id)
+
+
+PROFILE_STORE = ProfileStore()
+
+
+def profiling_requested(scope):
+    if (dict(scope.get("headers") or []).get(PROFILE_HEADER) or b"").lower() in (b"1", b"true"):
+        return True
+    return parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", [""])[0] in ("1", "true")
+
+
+class ProfilerMiddleware:
+    """
+    With PROFILING_ENABLED, a request sent with "X-Profile: 1" (or ?profile=1) is
+    sampled from start to end of its response. The response carries an X-Profile-Id
+    header naming the profile in GET /profiles/{profile_id}.
+    """
+
+    def __init__(self, app, enabled=PROFILING_ENABLED):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or not profiling_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode("ascii"))
+                ])
+            await send(message)
+
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            PROFILE_STORE.put(profile_id, {
+                "path": scope["path"],
+                "duration_s": profiler.duration,
+                "samples": profiler.samples,
+                "folded": profiler.folded(),
+            })
@@ -0,0 +1,166 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from utils.environment_variables import (
+    PDF_PROCESS_WORKERS,
+    PDF_PIPELINE_CONCURRENCY,
+    PDF_PIPELINE_QUEUE_DEPTH,
+    STREAM_BUFFER_SIZE,
+    STREAM_WORKERS,
+)
+from utils.metrics import METRICS
+
+_process_pool = None
+_stream_pool = None
+
+
+def get_process_pool():
+    # Spawned lazily so importing the app does not fork; "spawn" avoids inheriting
+    # the event loop and client threads of the API process.
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PDF_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def get_stream_pool():
+    # Threads of iterate_in_thread producers, which block for as long as their client is
+    # slow; kept apart from the default pool that MinIO, validation and /ready rely on
+    global _stream_pool
+    if _stream_pool is None:
+        _stream_pool = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix="stream")
+    return _stream_pool
+
+
+def shutdown_stream_pool():
+    global _stream_pool
+    if _stream_pool is not None:
+        _stream_pool.shutdown(wait=False, cancel_futures=True)
+        _stream_pool = None
+
+
+async def run_in_process(func, *args):
+    """
+    Runs a CPU-bound function (e.g. PyMuPDF parsing) in the process pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), partial(func, *args))
+
+
+async def run_in_thread(func, *args):
+    """
+    Runs a blocking I/O function (MinIO, OpenAI) in the default thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(func, *args))
+
+
+async def iterate_in_thread(func, *args, buffer_size=STREAM_BUFFER_SIZE):
+    """
+    Runs a blocking generator function in the stream thread pool (STREAM_WORKERS threads;
+    further streams wait for one) and yields its items on the event loop as they are
+    produced. The producer runs at most `buffer_size` items ahead of the consumer, so a
+    slow client holds back the generator instead of the whole output piling up in
+    memory. Closing the async generator stops the producer at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max(1, buffer_size))
+    stopped = threading.Event()
+    finished = object()
+
+    def put(entry):
+        # Blocks while the queue is full; gives up once the consumer has gone away
+        future = asyncio.run_coroutine_threadsafe(queue.put(entry), loop)
+        while True:
+            try:
+                future.result(timeout=0.1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stopped.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        if stopped.is_set():
+            return  # The consumer went away while this stream waited for a thread
+        try:
+            for item in func(*args):
+                if stopped.is_set() or not put((item, None)):
+                    return
+        except Exception as e:
+            put((finished, e))
+            return
+        put((finished, None))
+
+    producer = loop.run_in_executor(get_stream_pool(), produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+        # A producer still waiting for a thread is dropped rather than waited for
+        producer.cancel()
+        await asyncio.wait([producer])
+
+
+class PipelineBusyError(Exception):
+    pass
+
+
+class PipelineLimiter:
+    """
+    Admits at most `concurrency` documents into the pipeline at once and lets at most
+    `queue_depth` more wait for a slot; anything beyond that is rejected immediately.
+    Batch documents wait for a slot instead of being rejected (their batch bounds how
+    many of them wait), and count towards the queue that single uploads see.
+    """
+
+    def __init__(self, concurrency, queue_depth):
+        self.concurrency = concurrency
+        self.max_pending = concurrency + queue_depth
+        self.pending = 0
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        # Created on first use so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self, wait=False):
+        if not wait and self.pending >= self.max_pending:
+            raise PipelineBusyError("Too many documents are being processed, try again later")
+        self.pending += 1
+        try:
+            async with self.semaphore:
+                yield
+        finally:
+            self.pending -= 1
+
+
+PIPELINE_LIMITER = PipelineLimiter(PDF_PIPELINE_CONCURRENCY, PDF_PIPELINE_QUEUE_DEPTH)
+
+METRICS.gauge("pipeline_documents_pending", "Documents in the pipeline or waiting for a slot.",
+              function=lambda: PIPELINE_LIMITER.pending)
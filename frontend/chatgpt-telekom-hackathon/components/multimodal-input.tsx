@@ -146,6 +146,7 @@ export function MultimodalInput({
         const formData = new FormData();
         formData.append('user_document', selectedFiles[0]);
         formData.append('instruction_document', selectedFiles[1]);
+        formData.append('session_id', '1');
 
         try {
             // Step 1: Upload PDFs to `/process_pdf`
@@ -160,6 +161,9 @@ export function MultimodalInput({
                 return;
             }
 
+            // The anomalies of this upload are stored under its document id
+            const documentId = pdfResponse.headers.get('X-Document-Id');
+
             // Extract the PDF blob
             const pdfBlob = await pdfResponse.blob();
             const pdfUrl = URL.createObjectURL(pdfBlob); // Create a URL for the PDF blob
@@ -179,6 +183,7 @@ export function MultimodalInput({
                 body: JSON.stringify({
                     session_id: '1',
                     user_query: input,
+                    document_id: documentId,
                 }),
             });
 